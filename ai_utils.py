@@ -1,22 +1,18 @@
-import google.generativeai as genai
-import streamlit as st
+import llm_backends
+import response_cache
 
 def get_model(api_key):
+    # Backends are built once per API key and reused across requests
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        return model
+        return llm_backends.get_backend(api_key)
     except Exception as e:
         return None
 
-def generate_ai_response(api_key, user_query, database_context, user_profile=None):
-    if not api_key:
-        return "Please enter a Gemini API Key in the settings to use the AI features."
-    
-    model = get_model(api_key)
-    if not model:
-        return "Error configuring AI model. Check your API Key."
+def ai_available(api_key):
+    # The local backend needs no key
+    return bool(api_key) or llm_backends.BACKEND == "local"
 
+def build_prompt(user_query, database_context, user_profile=None, conversation=None):
     # Construct Profile ContextStr
     profile_context = "User Profile: Unknown"
     if user_profile:
@@ -36,6 +32,7 @@ def generate_ai_response(api_key, user_query, database_context, user_profile=Non
     {profile_context}
     
     Use the following logs of the user's past dates to answer their question. 
+    These are the entries most relevant to the question, not necessarily the full history.
     Analyze patterns, preferences, and specific details from the logs.
     
     USER DATA LOGS:
@@ -43,9 +40,70 @@ def generate_ai_response(api_key, user_query, database_context, user_profile=Non
     
     Be concise, friendly, and insightful. 
     """
-    
+    if conversation:
+        system_prompt += f"""
+    CONVERSATION SO FAR (use it to follow up on earlier questions):
+    {conversation}
+    """
+    return f"{system_prompt}\n\nUSER QUESTION: {user_query}"
+
+def _resolve_backend(api_key, backend):
+    if backend is not None:
+        return backend, None
+    if not ai_available(api_key):
+        return None, "Please enter a Gemini API Key in the settings to use the AI features."
+    backend = get_model(api_key)
+    if not backend:
+        return None, "Error configuring AI model. Check your API Key."
+    return backend, None
+
+def generate_ai_response(api_key, user_query, database_context, user_profile=None, backend=None, context_version=None,
+                         conversation=None):
+    # context_version (dm.get_data_version()) enables the response cache; None bypasses it
+    backend, error = _resolve_backend(api_key, backend)
+    if error:
+        return error
+
+    cache_key = None
+    if context_version is not None:
+        cache_key = response_cache.make_key(backend.model_name, user_profile, context_version, user_query, conversation)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        response = model.generate_content(f"{system_prompt}\n\nUSER QUESTION: {user_query}")
-        return response.text
+        response = backend.generate(build_prompt(user_query, database_context, user_profile, conversation))
     except Exception as e:
         return f"AI Error: {str(e)}"
+    if cache_key:
+        response_cache.put(cache_key, response)
+    return response
+
+def stream_ai_response(api_key, user_query, database_context, user_profile=None, backend=None, context_version=None,
+                       conversation=None):
+    # Yields text chunks as the model produces them; errors are yielded as text
+    # so whatever arrived before a failure is still shown and saved
+    backend, error = _resolve_backend(api_key, backend)
+    if error:
+        yield error
+        return
+
+    cache_key = None
+    if context_version is not None:
+        cache_key = response_cache.make_key(backend.model_name, user_profile, context_version, user_query, conversation)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    chunks = []
+    try:
+        for chunk in backend.stream(build_prompt(user_query, database_context, user_profile, conversation)):
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        yield f"\n\nAI Error: {str(e)}"
+        return
+    # Only complete answers are cached
+    if cache_key:
+        response_cache.put(cache_key, "".join(chunks))
@@ -0,0 +1,117 @@
+import re
+
+import db
+
+# All reads here hit the trigger-maintained summary tables from migration 12,
+# so their cost depends on the number of partners/tags/months, not on entries.
+
+def get_overview():
+    with db.connection() as conn:
+        total_dates, partners, first_date, last_date = conn.execute(
+            "SELECT COALESCE(sum(date_count), 0), count(*), min(first_date), max(last_date) FROM partner_stats"
+        ).fetchone()
+        top_partner = conn.execute(
+            "SELECT partner_name, date_count FROM partner_stats ORDER BY date_count DESC, last_date DESC LIMIT 1"
+        ).fetchone()
+        top_tag = conn.execute('''SELECT t.tag_name, sum(m.entry_count) AS n
+                                  FROM tag_monthly_counts m JOIN custom_tags t ON t.id = m.tag_id
+                                  GROUP BY m.tag_id ORDER BY n DESC LIMIT 1''').fetchone()
+    return {
+        'total_dates': total_dates,
+        'partners': partners,
+        'first_date': first_date,
+        'last_date': last_date,
+        'top_partner': top_partner,
+        'top_tag': top_tag,
+    }
+
+def get_partner_stats(limit=None):
+    sql = '''SELECT partner_name, date_count, first_date, last_date
+             FROM partner_stats ORDER BY date_count DESC, last_date DESC'''
+    params = []
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with db.connection() as conn:
+        return db.read_frame(conn, sql, params=params)
+
+def get_tag_totals():
+    with db.connection() as conn:
+        return db.read_frame(conn, '''SELECT t.tag_name, sum(m.entry_count) AS entry_count
+                                      FROM tag_monthly_counts m JOIN custom_tags t ON t.id = m.tag_id
+                                      GROUP BY m.tag_id ORDER BY entry_count DESC, t.tag_name ASC''')
+
+def get_tag_trends(since_month=None):
+    """Long-format (month, tag_name, entry_count); pivot for charts."""
+    sql = '''SELECT m.month, t.tag_name, m.entry_count
+             FROM tag_monthly_counts m JOIN custom_tags t ON t.id = m.tag_id'''
+    params = []
+    if since_month:
+        sql += " WHERE m.month >= ?"
+        params.append(since_month)
+    sql += " ORDER BY m.month ASC"
+    with db.connection() as conn:
+        return db.read_frame(conn, sql, params=params)
+
+def get_tag_trend_matrix(since_month=None):
+    # Months x tags, zero-filled, ready for st.line_chart / st.area_chart
+    trends = get_tag_trends(since_month)
+    return trends.pivot_table(index='month', columns='tag_name', values='entry_count', fill_value=0)
+
+def get_tag_cooccurrence(min_count=1, limit=50):
+    sql = '''SELECT ta.tag_name AS tag_a, tb.tag_name AS tag_b, p.entry_count
+             FROM tag_pair_counts p
+             JOIN custom_tags ta ON ta.id = p.tag_a
+             JOIN custom_tags tb ON tb.id = p.tag_b
+             WHERE p.entry_count >= ?
+             ORDER BY p.entry_count DESC LIMIT ?'''
+    with db.connection() as conn:
+        return db.read_frame(conn, sql, params=(min_count, limit))
+
+# --- INSTANT ANSWERS ---
+# Questions that the aggregates answer exactly; anything else goes to the model.
+# Each pattern must match the whole question, so qualified ones ("...last month",
+# "...with Sam", "who was the most fun") still get a real answer from the coach.
+_SO_FAR = r"(?: (?:in total|total|so far|overall|altogether|ever))?"
+_QUESTION_PATTERNS = [
+    ('total', re.compile(r"how many dates(?: (?:have i (?:been on|gone on|had|logged)|did i (?:go on|have|log)))?"
+                         + _SO_FAR)),
+    ('partner_count', re.compile(r"how many (?:different )?(?:people|partners) have i (?:dated|been on dates with|"
+                                 r"gone out with|seen)" + _SO_FAR)),
+    ('last_date', re.compile(r"when (?:was|is) my (?:last|latest|most recent) date")),
+    ('top_partners', re.compile(r"who (?:have i|did i) (?:(?:dated|date|seen|see|gone out with|go out with) "
+                                r"(?:the )?most(?: often)?|been on (?:the )?most dates with)" + _SO_FAR)),
+    ('top_tags', re.compile(r"(?:what are )?my (?:most (?:common|frequent)|top) (?:tags|vibes)")),
+]
+
+def _normalize_question(query_text):
+    return " ".join(query_text.lower().split()).rstrip("?!. ")
+
+def answer_question(query_text):
+    """Return a markdown answer from the aggregates, or None if the question isn't a known stat."""
+    question = _normalize_question(query_text)
+    kind = next((name for name, pattern in _QUESTION_PATTERNS if pattern.fullmatch(question)), None)
+    if kind is None:
+        return None
+
+    overview = get_overview()
+    if not overview['total_dates']:
+        return "You haven't logged any dates yet."
+    if kind == 'total':
+        return (f"You've logged **{overview['total_dates']}** dates with **{overview['partners']}** different people "
+                f"between {overview['first_date']} and {overview['last_date']}.")
+    if kind == 'partner_count':
+        return f"You've been on dates with **{overview['partners']}** different people."
+    if kind == 'last_date':
+        return f"Your most recent logged date was on **{overview['last_date']}**."
+    if kind == 'top_partners':
+        top = get_partner_stats(limit=5)
+        lines = [f"- **{r.partner_name}**: {r.date_count} dates (last on {r.last_date})" for r in top.itertuples()]
+        return "The people you've seen most:\n\n" + "\n".join(lines)
+    if kind == 'top_tags':
+        top = get_tag_totals().head(5)
+        if top.empty:
+            return "You haven't tagged any dates yet."
+        lines = [f"- **{r.tag_name}**: {r.entry_count} dates" for r in top.itertuples()]
+        return "Your most common vibes:\n\n" + "\n".join(lines)
+    return None
@@ -1,18 +1,135 @@
 import streamlit as st
-import pandas as pd
 import os
 import shutil
+import tempfile
 from datetime import datetime
 import data_manager as dm
 import chat_manager as cm
 import ai_utils
+import analytics
+import exporter
+import importer
+import jobs
+import maintenance
+import media_store
+import migrations
+import perf
+import summarizer
+import tenancy
+
+HISTORY_PAGE_SIZE = 25
+CHAT_PAGE_SIZE = 50
+JOB_POLL_SECONDS = 1.0
+
+def render_media(item):
+    # Thumbnails and placeholders first; full-resolution files only load on request
+    full_key = f"media_full_{item['id']}"
+    show_full = st.session_state.get(full_key, False)
+    mtype = item['media_type']
+    # Imported rows from before paths were checked may point anywhere on the server
+    if not media_store.is_allowed_path(item['file_path']):
+        st.caption(f"🚫 {os.path.basename(item['file_path'])} (outside the media folder, not shown)")
+        return
+    if mtype == 'image':
+        st.image(item['file_path'] if show_full or not item['thumb_path'] else item['thumb_path'])
+    elif mtype == 'video' and show_full:
+        st.video(item['file_path'])
+    elif mtype == 'audio':
+        st.audio(item['file_path'])
+    else:
+        st.caption(f"🎬 {item['original_name'] or os.path.basename(item['file_path'])}")
+
+    if not show_full and (mtype == 'video' or (mtype == 'image' and item['thumb_path'])):
+        details = []
+        if item['width'] and item['height']:
+            details.append(f"{item['width']}×{item['height']}")
+        if item['size_bytes']:
+            details.append(f"{item['size_bytes'] / (1024 * 1024):.1f} MB")
+        label = "Load video" if mtype == 'video' else "View full size"
+        if st.button(f"{label} {' · '.join(details)}".strip(), key=f"load_{full_key}"):
+            st.session_state[full_key] = True
+            st.rerun()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job(job_id, render):
+    # Reruns on its own while the job is active, then reruns the page once to show the result.
+    # Fragment reruns skip the top of the script, so the tenant is re-activated here.
+    tenancy.activate(st.session_state.get("active_tenant"))
+    job = jobs.get_job(job_id)
+    if job is None or job['status'] not in jobs.ACTIVE_STATUSES:
+        st.rerun()
+    render(job)
+
+def render_pending_reply(job):
+    with st.chat_message("assistant"):
+        st.markdown(job['progress'] or "_Thinking…_")
+
+def render_pending_export(job):
+    st.info("Preparing export…")
+
+def render_pending_maintenance(job):
+    st.info("Cleaning up…")
+
+def render_pending_summaries(job):
+    st.info(f"Summarizing dates… {job['progress'] or ''}")
+
+def render_pending_vacuum(job):
+    st.info("Rewriting the database…")
+
+def signed_in_user():
+    # Streamlit's own login (st.login with an [auth] section in secrets.toml), else a trusted proxy header
+    if st.user.get("is_logged_in"):
+        return st.user.get("email") or st.user.get("sub")
+    if tenancy.TRUSTED_USER_HEADER:
+        return st.context.headers.get(tenancy.TRUSTED_USER_HEADER) or None
+    return None
+
+def login_configured():
+    try:
+        return "auth" in st.secrets
+    except Exception:
+        # No secrets.toml at all
+        return False
 
 # Page config
 st.set_page_config(page_title="Date Logger - Personal AI Coach", page_icon="❤️", layout="wide")
 
-# Initialize DBs
-dm.init_db()
-cm.init_chat_db()
+# Optional per-rerun timings and query counts (set DATE_LOGGER_PERF=1)
+if perf.ENABLED:
+    perf.enable()
+    perf.start_run()
+
+# Route this rerun to the visitor's own database and media folder, before
+# migrations and every query after this point. Signed-in visitors get the tenant
+# of their identity. Without sign-in the sidebar's user name picks it: that keeps
+# logs apart but is not access control, so it is only for local, trusted use.
+identity = signed_in_user()
+if identity:
+    tenancy.activate(tenancy.tenant_for_identity(identity))
+elif tenancy.TRUSTED_USER_HEADER or login_configured():
+    st.title("❤️ Date Logger & AI Coach")
+    st.info("Please sign in to see your date log.")
+    if login_configured():
+        st.button("Log in", on_click=st.login)
+    st.stop()
+else:
+    try:
+        tenancy.activate(st.session_state.get("tenant_id", ""))
+    except ValueError:
+        tenancy.activate(None)
+if st.session_state.get("active_tenant") != tenancy.current():
+    # Paging cursors, chat windows and job ids belong to the previous user's data
+    for key in [k for k in st.session_state if k in ("history_cursors", "export_job") or k.startswith("chat_window_")]:
+        del st.session_state[key]
+    st.session_state.active_tenant = tenancy.current()
+
+# Apply pending schema migrations (runs once per database file, no-op on reruns)
+migrations.migrate()
+# Take over background jobs a process that has gone away left unfinished
+jobs.resume_pending()
+# Daily retention / media sweep / vacuum, off the script thread
+if maintenance.is_due() and not jobs.get_jobs('maintenance', active_only=True):
+    jobs.submit('maintenance', {}, ref='maintenance')
 
 # Custom CSS for aesthetics
 st.markdown("""
@@ -47,6 +164,18 @@ if 'gemini_api_key' not in st.session_state:
 
 # Sidebar
 with st.sidebar:
+    st.header("👤 User")
+    if identity:
+        st.caption(f"Signed in as {identity}")
+        if st.user.get("is_logged_in"):
+            st.button("Log out", on_click=st.logout)
+    else:
+        st.text_input("User name", key="tenant_id",
+                      help="Each user gets a separate log. Leave empty for the shared log. "
+                           "Names are not passwords: anyone using this app can open any user's log.")
+        if st.session_state.tenant_id and tenancy.current() is None:
+            st.error("User names may only contain letters, digits, '.', '_' and '-'.")
+
     st.header("🔑 AI Access")
     
     # API Key Input
@@ -59,7 +188,7 @@ with st.sidebar:
     
     st.header("Navigation")
     # Updated Tabs
-    tab_selection = st.radio("Go to", ["Log Date", "View History", "Chat Companion", "Settings"])
+    tab_selection = st.radio("Go to", ["Log Date", "View History", "Insights", "Chat Companion", "Settings"])
 
     if tab_selection == "Chat Companion":
         st.divider()
@@ -75,6 +204,9 @@ with st.sidebar:
                 sessions['id'].tolist(), 
                 format_func=lambda x: sessions[sessions['id'] == x]['title'].values[0]
             )
+            if st.button("🗑️ Delete Chat"):
+                cm.delete_session(selected_session_id)
+                st.rerun()
         else:
             selected_session_id = None
             if st.button("Start First Chat"):
@@ -118,14 +250,15 @@ if tab_selection == "Log Date":
                     for uploaded_file in uploaded_files:
                         # Determine type
                         file_type = uploaded_file.type.split('/')[0] # 'image', 'video', 'audio'
-                        # Save file
-                        save_path = os.path.join("media", uploaded_file.name)
-                        with open(save_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-                        media_list.append((save_path, file_type))
+                        # Stream to content-addressed storage (dedupes); thumbnails are made in the background
+                        media_list.append(media_store.ingest_upload(uploaded_file, file_type, thumbnail=False))
                 
                 success, msg = dm.add_entry(date, partner_name, social_media, notes, tags, media_list)
                 if success:
+                    for item in media_list:
+                        if item['media_type'] == 'image':
+                            jobs.submit('thumbnail', {'file_path': item['file_path'], 'sha256': item['sha256']},
+                                        ref='thumbnails')
                     st.success(msg)
                 else:
                     st.error(f"Error saving: {msg}")
@@ -134,21 +267,64 @@ if tab_selection == "Log Date":
 elif tab_selection == "View History":
     st.header("📜 History")
     
-    df = dm.get_all_entries()
+    total_entries = dm.count_entries()
     
-    if not df.empty:
-        # Download options
-        col1, col2 = st.columns([1, 4])
-        with col1:
-            csv = df.to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Download CSV", csv, "date_log.csv", "text/csv")
+    if total_entries:
+        # Download options: the file is only built when asked for, streamed from SQLite in batches
+        with st.expander("📥 Export"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                export_format = st.selectbox("Format", exporter.available_formats(), format_func=str.upper)
+            with col2:
+                export_tags = st.checkbox("Include tags", value=True)
+            with col3:
+                export_media = st.checkbox("Include media paths")
+            
+            if st.button("Prepare export"):
+                previous = jobs.get_job(st.session_state.get('export_job'))
+                if previous and previous['result'] and os.path.exists(previous['result']['path']):
+                    os.remove(previous['result']['path'])
+                st.session_state.export_job = jobs.submit(
+                    'export', {'fmt': export_format, 'include_tags': export_tags, 'include_media': export_media},
+                    ref='export')
+            
+            export_job = jobs.get_job(st.session_state.get('export_job'))
+            if export_job and export_job['status'] in jobs.ACTIVE_STATUSES:
+                poll_job(export_job['id'], render_pending_export)
+            elif export_job and export_job['status'] == 'failed':
+                st.error(f"Export failed: {export_job['error']}")
+            elif export_job and os.path.exists(export_job['result']['path']):
+                export_file = export_job['result']
+                with open(export_file['path'], "rb") as f:
+                    st.download_button(f"Download {export_file['name']}", f, export_file['name'], export_file['mime'])
+        
+        # Keyset pagination: cursors of every page visited so far, first page is None
+        if 'history_cursors' not in st.session_state:
+            st.session_state.history_cursors = [None]
+        page_index = len(st.session_state.history_cursors) - 1
+        df, next_cursor = dm.get_entries_page(HISTORY_PAGE_SIZE, st.session_state.history_cursors[-1])
         
         # Display Data
         st.dataframe(df.drop(columns=['id']), use_container_width=True)
         
+        nav_prev, nav_info, nav_next = st.columns([1, 3, 1])
+        with nav_prev:
+            if page_index > 0 and st.button("← Newer"):
+                st.session_state.history_cursors.pop()
+                st.rerun()
+        with nav_info:
+            st.caption(f"Page {page_index + 1} of {-(-total_entries // HISTORY_PAGE_SIZE)} · {total_entries} entries")
+        with nav_next:
+            if next_cursor is not None and st.button("Older →"):
+                st.session_state.history_cursors.append(next_cursor)
+                st.rerun()
+        
         st.divider()
         st.subheader("Detailed View")
         
+        # One query for all media on this page instead of one per entry
+        page_media = dm.get_media_for_entries(df['id'].tolist())
+        
         for index, row in df.iterrows():
             with st.expander(f"{row['date']} - {row['partner_name']}"):
                 # Display Tags
@@ -161,18 +337,48 @@ elif tab_selection == "View History":
                 st.write(f"**Social Media:** {row['social_media']}")
                 st.write(f"**Notes:** {row['notes']}")
                 
-                media_items = dm.get_media_for_entry(row['id'])
+                media_items = page_media.get(row['id'], [])
                 if media_items:
                     st.write("---")
                     cols = st.columns(3)
-                    for i, (path, mtype) in enumerate(media_items):
+                    for i, item in enumerate(media_items):
                         with cols[i % 3]:
-                            if mtype == 'image':
-                                st.image(path)
-                            elif mtype == 'video':
-                                st.video(path)
-                            elif mtype == 'audio':
-                                st.audio(path)
+                            render_media(item)
+
+                if st.button("🗑️ Delete this date", key=f"delete_entry_{row['id']}"):
+                    ok, msg = maintenance.delete_entry(int(row['id']))
+                    if ok:
+                        st.rerun()
+                    else:
+                        st.error(msg)
+    else:
+        st.info("No entries yet. Go to 'Log Date' to add one!")
+
+# --- TAB: INSIGHTS ---
+elif tab_selection == "Insights":
+    st.header("📊 Insights")
+    overview = analytics.get_overview()
+    if overview['total_dates']:
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Dates logged", overview['total_dates'])
+        m2.metric("People", overview['partners'])
+        m3.metric("Top vibe", overview['top_tag'][0] if overview['top_tag'] else "-")
+        m4.metric("Last date", overview['last_date'])
+
+        tag_totals = analytics.get_tag_totals()
+        if not tag_totals.empty:
+            st.subheader("Vibes")
+            st.bar_chart(tag_totals.set_index('tag_name')['entry_count'])
+            st.subheader("Vibes over time")
+            st.line_chart(analytics.get_tag_trend_matrix())
+
+        col_partners, col_pairs = st.columns(2)
+        with col_partners:
+            st.subheader("People")
+            st.dataframe(analytics.get_partner_stats(limit=50), hide_index=True, use_container_width=True)
+        with col_pairs:
+            st.subheader("Vibes that go together")
+            st.dataframe(analytics.get_tag_cooccurrence(min_count=2, limit=20), hide_index=True, use_container_width=True)
     else:
         st.info("No entries yet. Go to 'Log Date' to add one!")
 
@@ -181,12 +387,19 @@ elif tab_selection == "Chat Companion":
     st.header("💬 AI Dating Coach")
     st.markdown("Ask me anything about your dates! I'll use your logs and profile to give personalized advice.")
     
-    if not st.session_state.gemini_api_key:
+    if not ai_utils.ai_available(st.session_state.gemini_api_key):
         st.warning("⚠️ Please enter your Gemini API Key in the Sidebar to enable AI features! Simple search is still active below.")
 
     if selected_session_id:
-        # Display chat history
-        messages = cm.get_messages(selected_session_id)
+        # Display chat history: only the latest window is loaded and rendered
+        window_key = f"chat_window_{selected_session_id}"
+        window = st.session_state.get(window_key, CHAT_PAGE_SIZE)
+        messages = cm.get_messages(selected_session_id, limit=window + 1)
+        if len(messages) > window:
+            messages = messages[1:]
+            if st.button("⬆️ Load older messages"):
+                st.session_state[window_key] = window + CHAT_PAGE_SIZE
+                st.rerun()
         for msg in messages:
             with st.chat_message(msg['role']):
                 st.write(msg['content'])
@@ -194,31 +407,46 @@ elif tab_selection == "Chat Companion":
         # Chat Input
         if prompt := st.chat_input("Ask about your dates..."):
             # 1. User Message
-            cm.add_message(selected_session_id, "user", prompt)
+            prompt_id = cm.add_message(selected_session_id, "user", prompt)
             with st.chat_message("user"):
                 st.write(prompt)
             
             # 2. Assistant Logic
             
-            # Check for AI Key
-            if st.session_state.gemini_api_key:
-                context = dm.get_all_context_for_ai()
-                user_profile = dm.get_user_profile()
-                response = ai_utils.generate_ai_response(st.session_state.gemini_api_key, prompt, context, user_profile)
-            else:
+            # Stats questions are answered from the precomputed aggregates, no API call
+            response = analytics.answer_question(prompt)
+            if response is None and ai_utils.ai_available(st.session_state.gemini_api_key):
+                # Answered by a background job; the poller below shows it as it streams in
+                jobs.submit('ai_response',
+                            {'session_id': int(selected_session_id), 'prompt': prompt, 'prompt_id': prompt_id},
+                            ref=f"chat:{selected_session_id}", api_key=st.session_state.gemini_api_key)
+            elif response is None:
                 # Fallback to Simple RAG
-                results = dm.search_entries(prompt) 
+                results = dm.search_entries(prompt, limit=10)
                 if not results.empty:
-                    response = f"I found {len(results)} entries matching keywords:\n\n"
+                    response = f"Here are the {len(results)} most relevant entries I found:\n\n"
                     for i, row in results.iterrows():
-                        response += f"- **{row['date']}** with **{row['partner_name']}** ({row['tags']}): {row['notes']}\n"
+                        response += f"- **{row['date']}** with **{row['partner_name']}** ({row['tags']}): {row['snippet']}\n"
                 else:
                     response = "I couldn't find any specific records matching that with simple search. Add an API Key for deeper insights!"
 
-            # 3. Save & Display Assistant Message
-            cm.add_message(selected_session_id, "assistant", response)
-            with st.chat_message("assistant"):
-                st.write(response)
+            # 3. Display and save an answer produced inline
+            if response is not None:
+                with st.chat_message("assistant"):
+                    st.markdown(response)
+                cm.add_message(selected_session_id, "assistant", response)
+
+        # Replies still being written by background jobs, possibly from an earlier rerun
+        for job in jobs.get_jobs(f"chat:{selected_session_id}", active_only=True):
+            poll_job(job['id'], render_pending_reply)
+        # A reply cut off by a restart is offered again, with this visitor's own key
+        last_reply_job = jobs.latest_job(f"chat:{selected_session_id}")
+        if last_reply_job and last_reply_job['status'] == 'interrupted':
+            st.warning(f"The reply to \"{last_reply_job['payload']['prompt']}\" was interrupted.")
+            if st.button("Retry", disabled=not ai_utils.ai_available(st.session_state.gemini_api_key)):
+                jobs.submit('ai_response', last_reply_job['payload'], ref=f"chat:{selected_session_id}",
+                            api_key=st.session_state.gemini_api_key)
+                st.rerun()
                 
     else:
         st.write("Create a new chat session to start!")
@@ -255,7 +483,38 @@ elif tab_selection == "Settings":
 
     st.divider()
 
-    # 2. Tag Manager Section
+    # 2. Bulk Import Section
+    st.subheader("Import History")
+    st.write("Bring in dates from a spreadsheet or another app. Columns: date, partner_name, social_media, notes, tags (comma-separated), "
+             f"media (semicolon-separated paths inside `{media_store.media_dir()}`).")
+    
+    import_upload = st.file_uploader("CSV, JSON, JSONL or Excel file", type=importer.IMPORT_FORMATS)
+    if import_upload and st.button("Import"):
+        ext = os.path.splitext(import_upload.name)[1].lower()
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+            shutil.copyfileobj(import_upload, tmp)
+        status = st.empty()
+        try:
+            summary = importer.import_file(
+                tmp.name,
+                progress=lambda read, imported, errors: status.text(f"Read {read} rows · imported {imported} · {errors} skipped"),
+            )
+        except ValueError as e:
+            st.error(f"Couldn't import {import_upload.name}: {e}")
+        else:
+            if summary['already_imported']:
+                st.info("This file was already imported.")
+            else:
+                st.success(f"Imported {summary['imported']} entries.")
+            if summary['errors']:
+                st.warning(f"Skipped {len(summary['errors'])} invalid rows:")
+                st.dataframe([{"row": row, "problem": problem} for row, problem in summary['errors']], use_container_width=True)
+        finally:
+            os.remove(tmp.name)
+    
+    st.divider()
+
+    # 3. Tag Manager Section
     st.subheader("Unqiue Tags")
     st.write("Customize the attributes you see when logging a date.")
     
@@ -284,3 +543,73 @@ elif tab_selection == "Settings":
         if col_del.button("❌", key=f"del_{tag}"):
             dm.delete_custom_tag(tag)
             st.rerun()
+
+    st.divider()
+
+    # 4. Analyze History Section
+    st.subheader("🧠 Analyze History")
+    summarized, total = summarizer.summary_status()
+    st.write(f"{summarized} of {total} dates have an AI summary. Summaries let the coach consider more of your history "
+             "at once; only new or edited dates are summarized again.")
+    summary_jobs = jobs.get_jobs('summaries')
+    last_run = summary_jobs[-1] if summary_jobs else None
+    if last_run and last_run['status'] in jobs.ACTIVE_STATUSES:
+        poll_job(last_run['id'], render_pending_summaries)
+    else:
+        if last_run and last_run['status'] == 'done':
+            result = last_run['result']
+            st.caption(f"Last run: {result['summarized']} summarized, {result['unchanged']} unchanged, "
+                       f"{result['failed']} failed.")
+        elif last_run and last_run['status'] == 'failed':
+            st.error(f"Last run failed: {last_run['error']}")
+        elif last_run and last_run['status'] == 'interrupted':
+            st.warning("Last run was interrupted by a restart; run it again to finish the remaining dates.")
+        force = st.checkbox("Re-analyze every date, not just changed ones")
+        if st.button("Summarize every date", disabled=not ai_utils.ai_available(st.session_state.gemini_api_key)):
+            jobs.submit('summarize', {'force': force}, ref='summaries', api_key=st.session_state.gemini_api_key)
+            st.rerun()
+
+    st.divider()
+
+    # 5. Storage & Retention Section
+    st.subheader("🧹 Storage & Retention")
+    retention_days = st.number_input("Delete chats inactive for this many days (0 keeps them forever)",
+                                     min_value=0, value=maintenance.get_chat_retention_days(), step=30)
+    if retention_days != maintenance.get_chat_retention_days():
+        maintenance.set_chat_retention_days(retention_days)
+        st.success("Retention updated; it applies at the next maintenance run.")
+    maintenance_jobs = jobs.get_jobs('maintenance')
+    last_maintenance = maintenance_jobs[-1] if maintenance_jobs else None
+    if last_maintenance and last_maintenance['status'] in jobs.ACTIVE_STATUSES:
+        poll_job(last_maintenance['id'], render_pending_maintenance)
+    else:
+        if last_maintenance and last_maintenance['status'] == 'done' and last_maintenance['result']:
+            report = last_maintenance['result']
+            st.caption(f"Last run {last_maintenance['finished_at']} UTC: {report['sessions_deleted']} old chats deleted, "
+                       f"{report['media_swept']['files']} unused files removed "
+                       f"({report['media_swept']['bytes'] / (1024 * 1024):.1f} MB), {report['pages_freed']} pages freed.")
+        if st.button("Run maintenance now"):
+            jobs.submit('maintenance', {'force': True}, ref='maintenance')
+            st.rerun()
+
+    # Older databases can't hand freed space back until they are rewritten once
+    vacuum_job = jobs.latest_job('vacuum')
+    if vacuum_job and vacuum_job['status'] in jobs.ACTIVE_STATUSES:
+        poll_job(vacuum_job['id'], render_pending_vacuum)
+    elif not maintenance.incremental_vacuum_enabled():
+        if vacuum_job and vacuum_job['status'] in ('failed', 'interrupted'):
+            st.error(f"Enabling space reclaim failed: {vacuum_job['error']}")
+        st.write("This log was created before space from deleted data could be reclaimed automatically. Enabling it "
+                 "rewrites the database once: saving is blocked until it finishes and it briefly needs about twice "
+                 "the database's size in free disk space.")
+        if st.button("Enable space reclaim"):
+            jobs.submit('vacuum', {}, ref='vacuum')
+            st.rerun()
+
+# --- PERFORMANCE PANEL ---
+if perf.ENABLED:
+    perf_records = perf.finish_run()
+    with st.sidebar.expander("⏱️ Performance (this rerun)"):
+        st.dataframe(perf_records, use_container_width=True, hide_index=True)
+        st.download_button("Export JSON lines", perf.to_jsonl(perf_records, page=tab_selection), "perf.jsonl", "application/json")
+        st.download_button("Export Prometheus text", perf.to_prometheus(), "perf.prom", "text/plain")
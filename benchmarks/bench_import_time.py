@@ -0,0 +1,69 @@
+"""Guard cold-start cost: time importing each app module in a fresh interpreter.
+
+    python -m benchmarks.bench_import_time --output import_time.json
+
+Fails (exit 1) if any module pulls in a heavy dependency at import time, or
+takes longer than --budget-ms to import.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "db", "migrations", "data_manager", "chat_manager", "ai_utils", "llm_backends",
+    "response_cache", "conversation_memory", "media_store", "exporter", "importer", "perf", "analytics", "tenancy", "jobs", "summarizer", "maintenance",
+]
+
+# Must only be imported on first use, never by importing an app module
+HEAVY = ["pandas", "numpy", "google.generativeai", "PIL", "openpyxl", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{'ms': round(elapsed, 2), 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def probe(module, repeat=3):
+    # Fresh interpreter per sample: nothing is cached in sys.modules
+    samples = []
+    heavy = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                             cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result['ms'])
+        heavy = result['heavy']
+    return {'min_ms': min(samples), 'heavy_imports': heavy}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {module: probe(module, args.repeat) for module in MODULES}
+    failures = []
+    for module, result in results.items():
+        problems = []
+        if result['heavy_imports']:
+            problems.append(f"imports {', '.join(result['heavy_imports'])}")
+        if result['min_ms'] > args.budget_ms:
+            problems.append(f"over {args.budget_ms:g} ms budget")
+        print(f"{module:22s} {result['min_ms']:8.2f} ms  {'; '.join(problems)}")
+        if problems:
+            failures.append(module)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'budget_ms': args.budget_ms, 'results': results}, f, indent=2)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Time every public data_manager / chat_manager function and the AI context path.
+
+Runs offline against a fresh temporary database:
+
+    python -m benchmarks.bench_managers --scale 1k --output bench.json
+    python -m benchmarks.bench_managers --scale 1k --compare bench.json
+
+--compare exits non-zero when any median is more than --threshold times slower
+than the baseline file.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# The local backend keeps the AI path offline
+os.environ.setdefault("DATE_LOGGER_LLM_BACKEND", "local")
+
+import ai_utils
+import chat_manager as cm
+import data_manager as dm
+import db
+import migrations
+from benchmarks import synthetic_data
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+    }
+
+def _cases():
+    session_id = int(cm.get_sessions()['id'].iloc[0])
+    first_page, cursor = dm.get_entries_page(25)
+    page_ids = first_page['id'].tolist()
+    entry_id = page_ids[0]
+    profile = dm.get_user_profile()
+    question = "Which dinner dates had great conversation?"
+
+    def cold_context():
+        dm._context_cache.clear()
+        dm.get_all_context_for_ai()
+
+    def ai_round_trip():
+        context = dm.get_relevant_context_for_ai(question)
+        ai_utils.generate_ai_response("", question, context, profile)
+
+    counter = iter(range(10 ** 9))
+    return [
+        ("dm.count_entries", dm.count_entries),
+        ("dm.get_all_entries", dm.get_all_entries),
+        ("dm.get_entries_page.first", lambda: dm.get_entries_page(25)),
+        ("dm.get_entries_page.next", lambda: dm.get_entries_page(25, cursor)),
+        ("dm.get_media_for_entry", lambda: dm.get_media_for_entry(entry_id)),
+        ("dm.get_media_for_entries", lambda: dm.get_media_for_entries(page_ids)),
+        ("dm.search_entries", lambda: dm.search_entries(question)),
+        ("dm.get_entries_with_tag", lambda: dm.get_entries_with_tag("Good Food")),
+        ("dm.get_entries_with_all_tags", lambda: dm.get_entries_with_all_tags(["Good Food", "Outdoorsy"])),
+        ("dm.get_tag_counts", dm.get_tag_counts),
+        ("dm.get_all_context_for_ai.cold", cold_context),
+        ("dm.get_all_context_for_ai.warm", dm.get_all_context_for_ai),
+        ("dm.get_relevant_context_for_ai", lambda: dm.get_relevant_context_for_ai(question)),
+        ("dm.get_data_version", dm.get_data_version),
+        ("dm.get_user_profile", dm.get_user_profile),
+        ("dm.get_custom_tags", dm.get_custom_tags),
+        ("cm.get_sessions", cm.get_sessions),
+        ("cm.get_messages", lambda: cm.get_messages(session_id)),
+        ("ai.context_and_local_response", ai_round_trip),
+        ("dm.add_entry", lambda: dm.add_entry("2024-06-01", "Bench", "", "benchmark write", ["Good Food"], [])),
+        ("dm.update_user_profile", lambda: dm.update_user_profile("Bench User", 30, "Other", "Marriage", "x")),
+        ("dm.add_custom_tag", lambda: dm.add_custom_tag(f"bench-tag-{next(counter)}")),
+        ("cm.create_session", lambda: cm.create_session("bench")),
+        ("cm.add_message", lambda: cm.add_message(session_id, "user", "benchmark message")),
+    ]
+
+def run(scale, seed=0, repeat=5):
+    n_entries = synthetic_data.SCALES[scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_FILE = os.path.join(tmp, "bench.db")
+        migrations.migrate()
+
+        start = time.perf_counter()
+        synthetic_data.generate(n_entries, seed=seed)
+        generate_s = time.perf_counter() - start
+
+        results = {}
+        for name, fn in _cases():
+            fn()  # warm-up
+            results[name] = _time(fn, repeat)
+        db.close_all()
+
+    return {
+        'meta': {
+            'scale': scale,
+            'entries': n_entries,
+            'seed': seed,
+            'repeat': repeat,
+            'generate_s': round(generate_s, 3),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for name, stats in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            continue
+        ratio = stats['median_ms'] / max(base['median_ms'], 1e-6)
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{name:40s} {base['median_ms']:10.3f} -> {stats['median_ms']:10.3f} ms  x{ratio:5.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(synthetic_data.SCALES), default="1k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        return 1 if regressions else 0
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Local stand-in for the Gemini REST API, for load tests and offline runs.
+
+    python -m benchmarks.fake_gemini --port 8765 --latency 1.5 --chunk-delay 0.05
+
+then run the app with DATE_LOGGER_LLM_BACKEND=gemini-rest and
+DATE_LOGGER_GEMINI_BASE_URL=http://127.0.0.1:8765 (any API key works).
+Serves generateContent and streamGenerateContent?alt=sse; answers come from
+llm_backends.LocalBackend, so they are deterministic.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_backends import LocalBackend
+
+_PATH = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """latency: seconds before the first byte; chunk_delay: between streamed chunks;
+    error_rate: share of requests answered with 429 RESOURCE_EXHAUSTED."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, chunk_delay=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, _Handler)
+        self.model = LocalBackend(latency=latency, chunk_delay=chunk_delay)
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'in_flight': 0, 'max_in_flight': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _enter(self):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.stats['errors'] += 1
+        return failed
+
+    def _leave(self):
+        with self._lock:
+            self.stats['in_flight'] -= 1
+
+def _chunk(text):
+    return {'candidates': [{'content': {'role': "model", 'parts': [{'text': text}]}}]}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        match = _PATH.match(self.path.split("?", 1)[0])
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not match:
+            self._send_json(404, {'error': {'code': 404, 'message': f"Unknown path {self.path}"}})
+            return
+        prompt = "".join(part.get('text', "")
+                         for content in json.loads(body).get('contents', [])
+                         for part in content.get('parts', []))
+
+        server = self.server
+        failed = server._enter()
+        try:
+            if failed:
+                self._send_json(429, {'error': {'code': 429, 'status': "RESOURCE_EXHAUSTED",
+                                                'message': "Resource has been exhausted (e.g. check quota)."}})
+            elif match['method'] == "generateContent":
+                self._send_json(200, _chunk(server.model.generate(prompt)))
+            else:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for piece in server.model.stream(prompt):
+                    self.wfile.write(b"data: " + json.dumps(_chunk(piece)).encode() + b"\r\n\r\n")
+                    self.wfile.flush()
+                self.close_connection = True
+        finally:
+            server._leave()
+
+def start(latency=0.0, chunk_delay=0.0, error_rate=0.0, port=0, seed=0):
+    """Serve on a background thread; returns the server (stop it with .shutdown())."""
+    server = FakeGeminiServer(("127.0.0.1", port), latency, chunk_delay, error_rate, seed)
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    args = parser.parse_args(argv)
+
+    server = FakeGeminiServer(("127.0.0.1", args.port), args.latency, args.chunk_delay, args.error_rate)
+    print(f"Fake Gemini API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Drive the data and chat paths from many concurrent simulated sessions.
+
+    python -m benchmarks.load_test --sessions 16 --duration 30 --latency 1.5
+    python -m benchmarks.load_test --sessions 16 --per-user --output load.json
+
+Each session is a thread acting like one app user: logging dates, paging
+history, searching and chatting with the coach. Chat goes through the
+"gemini-rest" backend pointed at a local fake Gemini server
+(benchmarks/fake_gemini.py) with the given latency. Runs against a fresh
+temporary database, shared by all sessions unless --per-user gives each
+its own (see tenancy.py).
+
+Reports throughput and p50/p95/p99 latency per operation, and counts
+failures by cause: SQLite lock contention, model errors, other. Exits
+non-zero on any lock error or when an operation's p99 exceeds --max-p99-ms.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import chat_manager as cm
+import data_manager as dm
+import db
+import jobs
+import llm_backends
+import migrations
+import tenancy
+from benchmarks import fake_gemini, synthetic_data
+
+# Relative frequency of each simulated user action
+DEFAULT_MIX = {'log_date': 3, 'read_history': 3, 'search': 1, 'chat': 3}
+
+def _classify(error):
+    text = str(error).lower()
+    if "database is locked" in text or "database is busy" in text or "database table is locked" in text:
+        return 'lock'
+    if "ai error" in text or "gemini api returned" in text:
+        return 'model'
+    return 'other'
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # op -> [ms, ...]
+        self.errors = {}   # op -> {cause: count}
+        self.examples = {}  # cause -> first message seen
+
+    def record(self, op, elapsed_ms, error=None):
+        with self._lock:
+            self.samples.setdefault(op, []).append(elapsed_ms)
+            if error is not None:
+                cause = _classify(error)
+                by_cause = self.errors.setdefault(op, {})
+                by_cause[cause] = by_cause.get(cause, 0) + 1
+                self.examples.setdefault(cause, str(error)[:200])
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+class Session:
+    """One simulated user; every action raises on failure so the recorder sees it."""
+
+    def __init__(self, index, seed, via_jobs):
+        self.rng = random.Random(seed + index)
+        self.rows = synthetic_data.entry_rows(10 ** 6, seed=seed + index)
+        self.via_jobs = via_jobs
+        # Every simulated user brings their own key, so each gets its own rate limit
+        self.api_key = f"load-test-{index}"
+        self.turn = 0
+        self.cursor = None
+        self.session_id = cm.create_session(f"Load session {index}")
+
+    def log_date(self, recorder):
+        row = next(self.rows)
+        ok, msg = dm.add_entry(row['date'], row['partner_name'], row['social_media'], row['notes'], row['tags'], [])
+        if not ok:
+            raise RuntimeError(msg)
+
+    def read_history(self, recorder):
+        # Pages forward like a user clicking "Older", starting over at the end
+        _, self.cursor = dm.get_entries_page(25, self.cursor)
+
+    def search(self, recorder):
+        dm.search_entries(self.rng.choice(synthetic_data.ACTIVITIES))
+
+    def chat(self, recorder):
+        self.turn += 1
+        # Numbered so every question misses the response cache and reaches the model
+        prompt = f"{self.rng.choice(synthetic_data.CHAT_QUESTIONS)} (#{self.turn})"
+        start = time.perf_counter()
+        prompt_id = cm.add_message(self.session_id, "user", prompt)
+        recorder.record('add_message', (time.perf_counter() - start) * 1000)
+        if self.via_jobs:
+            job = jobs.wait(jobs.submit('ai_response', {'session_id': self.session_id, 'prompt': prompt,
+                                                        'prompt_id': prompt_id}, api_key=self.api_key))
+            if job['status'] != 'done':
+                raise RuntimeError(job['error'])
+            reply = cm.get_messages(self.session_id, limit=1)[0]['content']
+        else:
+            _, reply = jobs.reply_in_session(self.session_id, prompt, prompt_id, self.api_key)
+        if "AI Error:" in reply:
+            raise RuntimeError(reply.strip())
+
+def _run_session(index, args, clock, recorder, mix, ready):
+    tenant = f"load-{index}" if args.per_user else None
+    with tenancy.use_tenant(tenant) if tenant else nullcontext():
+        session = Session(index, args.seed, args.via_jobs)
+        ready.wait()
+        deadline = clock['deadline']
+        ops = list(mix)
+        weights = [mix[op] for op in ops]
+        done = 0
+        while time.monotonic() < deadline and (not args.iterations or done < args.iterations):
+            op = session.rng.choices(ops, weights)[0]
+            error = None
+            start = time.perf_counter()
+            try:
+                getattr(session, op)(recorder)
+            except Exception as e:
+                error = e
+            recorder.record(op, (time.perf_counter() - start) * 1000, error)
+            done += 1
+            if args.think_time:
+                time.sleep(session.rng.uniform(0, args.think_time))
+
+def _seed_database(n_entries, seed):
+    migrations.migrate()
+    synthetic_data.generate(n_entries, seed=seed, n_sessions=1, n_messages=0)
+
+def run(args):
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        op, weight = item.split("=")
+        if op not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown operation {op!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[op] = float(weight)
+    mix = {op: weight for op, weight in mix.items() if weight > 0}
+
+    server = fake_gemini.start(args.latency, args.chunk_delay, args.error_rate, seed=args.seed)
+    llm_backends.BACKEND = "gemini-rest"
+    llm_backends.GEMINI_BASE_URL = server.base_url
+    jobs.CONCURRENCY['ai_response'] = args.sessions
+
+    recorder = Recorder()
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_FILE = os.path.join(tmp, "load.db")
+        tenancy.TENANTS_DIR = os.path.join(tmp, "data")
+        if args.per_user:
+            for index in range(args.sessions):
+                with tenancy.use_tenant(f"load-{index}"):
+                    _seed_database(args.entries, args.seed + index)
+        else:
+            _seed_database(args.entries, args.seed)
+
+        # Sessions set up (chat session, tenant) first, then all start together
+        ready = threading.Event()
+        clock = {}
+        threads = [threading.Thread(target=_run_session, args=(i, args, clock, recorder, mix, ready),
+                                    name=f"session-{i}") for i in range(args.sessions)]
+        for thread in threads:
+            thread.start()
+        start = time.monotonic()
+        clock['deadline'] = start + args.duration
+        ready.set()
+        for thread in threads:
+            thread.join()
+        wall_s = time.monotonic() - start
+        server.shutdown()
+        db.close_all()
+
+    results = {}
+    for op, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        errors = recorder.errors.get(op, {})
+        results[op] = {
+            'count': len(samples),
+            'throughput_per_s': round(len(samples) / wall_s, 2),
+            'p50_ms': round(_percentile(samples, 0.50), 2),
+            'p95_ms': round(_percentile(samples, 0.95), 2),
+            'p99_ms': round(_percentile(samples, 0.99), 2),
+            'max_ms': round(samples[-1], 2),
+            'errors': errors,
+        }
+    total_ops = sum(r['count'] for op, r in results.items() if op != 'add_message')
+    return {
+        'meta': {
+            'sessions': args.sessions,
+            'per_user': args.per_user,
+            'via_jobs': args.via_jobs,
+            'duration_s': round(wall_s, 2),
+            'entries': args.entries,
+            'mix': mix,
+            'model_latency_s': args.latency,
+            'model_chunk_delay_s': args.chunk_delay,
+            'model_error_rate': args.error_rate,
+            'model_requests': server.stats['requests'],
+            'model_max_in_flight': server.stats['max_in_flight'],
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'totals': {
+            'operations': total_ops,
+            'throughput_per_s': round(total_ops / wall_s, 2),
+            'lock_errors': sum(r['errors'].get('lock', 0) for r in results.values()),
+            'model_errors': sum(r['errors'].get('model', 0) for r in results.values()),
+            'other_errors': sum(r['errors'].get('other', 0) for r in results.values()),
+            'error_examples': recorder.examples,
+        },
+        'results': results,
+    }
+
+def report(results):
+    print(f"{'operation':14s} {'count':>7s} {'ops/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}  errors")
+    for op, r in results['results'].items():
+        errors = ", ".join(f"{cause}={n}" for cause, n in r['errors'].items()) or "-"
+        print(f"{op:14s} {r['count']:7d} {r['throughput_per_s']:8.2f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+              f"{r['p99_ms']:9.2f} {r['max_ms']:9.2f}  {errors}")
+    totals = results['totals']
+    print(f"\n{totals['operations']} operations in {results['meta']['duration_s']} s "
+          f"({totals['throughput_per_s']} ops/s) from {results['meta']['sessions']} sessions; "
+          f"lock errors: {totals['lock_errors']}, model errors: {totals['model_errors']}, "
+          f"other errors: {totals['other_errors']}")
+    for cause, message in totals['error_examples'].items():
+        print(f"  first {cause} error: {message}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--iterations", type=int, default=0, help="stop each session after this many actions")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between actions (s)")
+    parser.add_argument("--entries", type=int, default=1000, help="dates seeded before the run (per user)")
+    parser.add_argument("--mix", nargs="*", metavar="OP=WEIGHT",
+                        help=f"override action weights, e.g. chat=0 (default {DEFAULT_MIX})")
+    parser.add_argument("--per-user", action="store_true", help="give every session its own database")
+    parser.add_argument("--via-jobs", action="store_true", help="send chat through the background job queue")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model time to first byte (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="fake model delay between chunks (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of model calls failing with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any operation's p99 exceeds this")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = results['totals']['lock_errors'] > 0
+    if args.max_p99_ms is not None:
+        slow = [op for op, r in results['results'].items() if r['p99_ms'] > args.max_p99_ms]
+        if slow:
+            print(f"p99 over {args.max_p99_ms:g} ms: {', '.join(slow)}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
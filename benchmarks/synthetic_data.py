@@ -0,0 +1,70 @@
+import os
+import random
+from datetime import date, timedelta
+
+import db
+import importer
+import media_store
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie", "Avery", "Quinn",
+               "Drew", "Harper", "Rowan", "Emerson", "Sage", "Parker", "Reese", "Skyler", "Dakota", "Blake"]
+ACTIVITIES = ["dinner", "coffee", "hiking", "museum", "concert", "picnic", "bowling", "karaoke",
+              "cooking class", "wine bar", "movie night", "farmers market", "board games", "beach walk"]
+FEELINGS = ["great conversation", "a bit awkward", "lots of laughs", "no spark", "felt comfortable",
+            "talked for hours", "they were late", "wonderful chemistry", "shared hobbies", "red flags"]
+TAGS = ["Good Conversation", "Shared Hobbies", "Great Sense of Humor", "Attractive", "Good Food",
+        "Romantic Connection", "Awkward Silence", "No Chemistry", "Red Flag", "Casual/Friends",
+        "Intellectual", "Outdoorsy", "Artsy", "Second Date", "Ghosted", "Long Distance"]
+CHAT_QUESTIONS = ["Who was my best date?", "What patterns do you see?", "Should I see Alex again?",
+                  "Which activities work best for me?", "Am I repeating mistakes?"]
+
+def entry_rows(n, seed=0):
+    rng = random.Random(seed)
+    partners = [f"{rng.choice(FIRST_NAMES)} {chr(65 + i % 26)}." for i in range(max(10, n // 20))]
+    start = date(2015, 1, 1)
+    # Under the active user's media directory, where the importer accepts media paths
+    media_root = os.path.join(media_store.media_dir(), "synthetic")
+    for i in range(n):
+        media = []
+        if rng.random() < 0.3:
+            media = [os.path.join(media_root, f"{i}_{k}.{rng.choice(['jpg', 'png', 'mp4', 'mp3'])}")
+                     for k in range(rng.randint(1, 3))]
+        yield {
+            'date': (start + timedelta(days=rng.randrange(3650))).isoformat(),
+            'partner_name': rng.choice(partners),
+            'social_media': f"@user{rng.randrange(10_000)}" if rng.random() < 0.5 else "",
+            'notes': f"We went to a {rng.choice(ACTIVITIES)}; {rng.choice(FEELINGS)} and {rng.choice(FEELINGS)}.",
+            'tags': rng.sample(TAGS, rng.randint(0, 4)),
+            'media': media,
+        }
+
+def generate(n_entries, seed=0, n_sessions=None, n_messages=None, batch_size=importer.IMPORT_BATCH_SIZE):
+    """Populate the current database with a reproducible synthetic dataset.
+
+    Defaults to one chat message per entry spread over n_entries // 100 sessions.
+    """
+    rng = random.Random(seed + 1)
+    n_sessions = n_sessions if n_sessions is not None else max(5, n_entries // 100)
+    n_messages = n_messages if n_messages is not None else n_entries
+
+    importer.import_rows(entry_rows(n_entries, seed), key=f"synthetic-{n_entries}-{seed}",
+                         batch_size=batch_size, resume=False)
+
+    with db.transaction() as conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO user_profile (id, name, age, gender, dating_goals, interests)
+                     VALUES (1, 'Bench User', 30, 'Prefer not to say', 'Long-term Relationship', 'hiking, food')
+                     ON CONFLICT(id) DO NOTHING''')
+        c.executemany("INSERT INTO chat_sessions (title) VALUES (?)",
+                      [(f"Chat {i}",) for i in range(n_sessions)])
+        first_session = c.execute("SELECT min(id) FROM chat_sessions").fetchone()[0]
+
+    for start in range(0, n_messages, batch_size):
+        with db.transaction() as conn:
+            conn.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                             [(first_session + rng.randrange(n_sessions),
+                               "user" if i % 2 == 0 else "assistant",
+                               rng.choice(CHAT_QUESTIONS) if i % 2 == 0 else rng.choice(FEELINGS).capitalize() + ".")
+                              for i in range(start, min(start + batch_size, n_messages))])
@@ -1,64 +1,71 @@
-import sqlite3
-import pandas as pd
 from datetime import datetime
 
-DB_FILE = "date_log.db"
+import db
+import maintenance
+import migrations
 
 def init_chat_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS chat_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER,
-                    role TEXT,
-                    content TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
-                )''')
-    conn.commit()
-    conn.close()
+    migrations.migrate()
 
 def create_session(title="New Chat"):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO chat_sessions (title) VALUES (?)", (title,))
-    session_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO chat_sessions (title) VALUES (?)", (title,))
+        session_id = c.lastrowid
     return session_id
 
 def get_sessions():
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql_query("SELECT * FROM chat_sessions ORDER BY created_at DESC", conn)
-    conn.close()
+    with db.connection() as conn:
+        df = db.read_frame(conn, "SELECT * FROM chat_sessions ORDER BY created_at DESC")
     return df
 
 def add_message(session_id, role, content):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", 
-              (session_id, role, content))
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                  (session_id, role, content))
+        message_id = c.lastrowid
+    return message_id
+
+def get_messages(session_id, limit=None, before_id=None):
+    """Messages of a session in chronological order.
+
+    With limit, only the latest `limit` messages (older than before_id, if
+    given) are read, seeking on idx_messages_session_id_id, so opening a long
+    session costs the same as opening a new one.
+    """
+    sql = "SELECT id, role, content FROM messages WHERE session_id = ?"
+    params = [session_id]
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(before_id)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    with db.connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [{'id': msg_id, 'role': role, 'content': content} for msg_id, role, content in reversed(rows)]
+
+def get_messages_after(session_id, after_id, limit, before_id=None):
+    """The first `limit` messages with id > after_id (and < before_id), oldest first."""
+    sql = "SELECT id, role, content FROM messages WHERE session_id = ? AND id > ?"
+    params = [session_id, after_id]
+    if before_id is not None:
+        sql += " AND id < ?"
+        params.append(before_id)
+    sql += " ORDER BY id ASC LIMIT ?"
+    params.append(limit)
+
+    with db.connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [{'id': msg_id, 'role': role, 'content': content} for msg_id, role, content in rows]
 
-def get_messages(session_id):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql_query("SELECT role, content FROM messages WHERE session_id = ? ORDER BY timestamp ASC", 
-                           conn, params=(session_id,))
-    conn.close()
-    return df.to_dict('records')
+def count_messages(session_id):
+    with db.connection() as conn:
+        return conn.execute("SELECT count(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
 
 def delete_session(session_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-    c.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
-    conn.commit()
-    conn.close()
+    # Cascade (messages, summary, finished jobs) lives in maintenance.delete_sessions
+    maintenance.delete_sessions([session_id])
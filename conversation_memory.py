@@ -0,0 +1,106 @@
+import chat_manager as cm
+import data_manager as dm
+import db
+
+# Tokens of chat history sent with each request, on top of dm.CONTEXT_TOKEN_BUDGET
+MEMORY_TOKEN_BUDGET = 1500
+# Share of the memory budget reserved for the rolling summary of older turns
+SUMMARY_SHARE = 0.3
+# At most this many turns are sent verbatim; older ones go into the summary
+VERBATIM_TURNS_MAX = 20
+# Unsummarized messages considered at once. Turns answered without the model
+# (instant stats, search fallback) don't pass through here, so a longer backlog
+# can build up; it is folded into the summary this many at a time, oldest first.
+RECENT_MESSAGES_MAX = 40
+# Older turns are folded into the summary in groups, not one message at a time
+SUMMARY_BATCH_MIN = 6
+
+ROLE_LABELS = {'user': "User", 'assistant': "Coach"}
+
+def get_summary(session_id):
+    with db.connection() as conn:
+        row = conn.execute("SELECT summary, summarized_through_id FROM chat_summaries WHERE session_id = ?",
+                           (session_id,)).fetchone()
+    return (row[0], row[1]) if row else ("", 0)
+
+def _save_summary(session_id, summary, through_id):
+    with db.transaction() as conn:
+        conn.execute('''INSERT INTO chat_summaries (session_id, summary, summarized_through_id, updated_at)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(session_id) DO UPDATE SET
+                        summary=excluded.summary,
+                        summarized_through_id=excluded.summarized_through_id,
+                        updated_at=excluded.updated_at''', (session_id, summary, through_id))
+
+def _format_turn(msg, max_chars=None):
+    content = " ".join(msg['content'].split())
+    if max_chars and len(content) > max_chars:
+        content = content[:max_chars].rstrip() + "…"
+    return f"{ROLE_LABELS.get(msg['role'], msg['role'])}: {content}"
+
+def _truncate_to_budget(text, token_budget):
+    # Keep the most recent part of the summary, where new facts are appended
+    max_chars = token_budget * 4
+    return text if len(text) <= max_chars else "…" + text[-max_chars:]
+
+def _extend_summary(summary, turns, token_budget, backend=None):
+    if backend is not None:
+        prompt = (
+            "You maintain a running summary of a dating-coach conversation. Update it with the new turns, "
+            f"keeping names, decisions and advice given. Stay under {token_budget * 3} words.\n\n"
+            f"CURRENT SUMMARY:\n{summary or '(empty)'}\n\nNEW TURNS:\n"
+            + "\n".join(_format_turn(t) for t in turns)
+            + "\n\nUSER QUESTION: Write the updated summary."
+        )
+        try:
+            return _truncate_to_budget(backend.generate(prompt).strip(), token_budget)
+        except Exception:
+            pass
+    # Extractive fallback: one clipped line per turn appended to the existing summary
+    lines = [summary] if summary else []
+    lines.extend(_format_turn(t, max_chars=160) for t in turns)
+    return _truncate_to_budget("\n".join(lines), token_budget)
+
+def build_conversation_context(session_id, before_id=None, token_budget=MEMORY_TOKEN_BUDGET, backend=None):
+    """Chat history for the next prompt: rolling summary + recent turns verbatim.
+
+    before_id excludes the message being answered. Turns not yet covered by
+    the stored summary are sent verbatim while they fit; once they don't, the
+    oldest are folded into the summary (at least SUMMARY_BATCH_MIN at a time,
+    so a summarizing model call is amortized over several turns). Only
+    messages after the summary are read, a page at a time, so the work per
+    request does not grow with the length of the session.
+    """
+    summary_budget = int(token_budget * SUMMARY_SHARE)
+    recent_budget = token_budget - summary_budget
+
+    summary, through_id = get_summary(session_id)
+    while True:
+        unsummarized = cm.get_messages_after(session_id, through_id, RECENT_MESSAGES_MAX + 1, before_id=before_id)
+        if len(unsummarized) <= RECENT_MESSAGES_MAX:
+            break
+        # More than one page behind: fold the oldest page whole, then look again
+        backlog = unsummarized[:RECENT_MESSAGES_MAX]
+        summary = _extend_summary(summary, backlog, summary_budget, backend)
+        through_id = backlog[-1]['id']
+        _save_summary(session_id, summary, through_id)
+    lines = [_format_turn(m) for m in unsummarized]
+    costs = [dm.estimate_tokens(line) for line in lines]
+
+    # Drop turns from the front until the rest fits the verbatim budget
+    start = 0
+    remaining = sum(costs)
+    while start < len(lines) and (remaining > recent_budget or len(lines) - start > VERBATIM_TURNS_MAX):
+        remaining -= costs[start]
+        start += 1
+    if start:
+        start = min(len(lines), max(start, SUMMARY_BATCH_MIN))
+        summary = _extend_summary(summary, unsummarized[:start], summary_budget, backend)
+        _save_summary(session_id, summary, unsummarized[start - 1]['id'])
+
+    parts = []
+    if summary:
+        parts.append("Summary of earlier conversation:\n" + summary)
+    if lines[start:]:
+        parts.append("Recent turns:\n" + "\n".join(lines[start:]))
+    return "\n\n".join(parts)
@@ -1,176 +1,386 @@
 import sqlite3
-import pandas as pd
 import os
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
-DB_FILE = "date_log.db"
+import db
+import migrations
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    # Entries table
-    c.execute('''CREATE TABLE IF NOT EXISTS entries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    partner_name TEXT NOT NULL,
-                    social_media TEXT,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )''')
-    
-    # Check for tags column
-    c.execute("PRAGMA table_info(entries)")
-    columns = [info[1] for info in c.fetchall()]
-    if 'tags' not in columns:
-        c.execute("ALTER TABLE entries ADD COLUMN tags TEXT")
-    
-    # Media table
-    c.execute('''CREATE TABLE IF NOT EXISTS media (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    entry_id INTEGER,
-                    file_path TEXT NOT NULL,
-                    media_type TEXT,
-                    FOREIGN KEY (entry_id) REFERENCES entries (id)
-                )''')
-
-    # User Profile Table
-    c.execute('''CREATE TABLE IF NOT EXISTS user_profile (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    name TEXT,
-                    age INTEGER,
-                    gender TEXT,
-                    dating_goals TEXT,
-                    interests TEXT
-                )''')
-    
-    # Custom Tags Table
-    c.execute('''CREATE TABLE IF NOT EXISTS custom_tags (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tag_name TEXT UNIQUE
-                )''')
-    
-    # Seed default tags if empty
-    c.execute("SELECT count(*) FROM custom_tags")
-    if c.fetchone()[0] == 0:
-        default_tags = [
-            "Good Conversation", "Shared Hobbies", "Great Sense of Humor", 
-            "Attractive", "Good Food", "Romantic Connection", 
-            "Awkward Silence", "No Chemistry", "Red Flag", "Casual/Friends",
-            "Intellectual", "Outdoorsy", "Artsy"
-        ]
-        c.executemany("INSERT OR IGNORE INTO custom_tags (tag_name) VALUES (?)", [(t,) for t in default_tags])
-
-    conn.commit()
-    conn.close()
+    # Schema lives in migrations.py; this is a no-op once the DB is current
+    migrations.migrate()
+
+# Tags live in entry_tags; this rebuilds the ", "-joined tags column callers expect
+ENTRY_COLUMNS = '''e.id, e.date, e.partner_name, e.social_media, e.notes, e.created_at,
+                    COALESCE((SELECT group_concat(t.tag_name, ', ')
+                              FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                              WHERE et.entry_id = e.id), '') AS tags'''
+
+def link_tags(c, pairs):
+    # pairs: (entry_id, tag_name); unknown tag names are created
+    pairs = list(pairs)
+    c.executemany("INSERT OR IGNORE INTO custom_tags (tag_name) VALUES (?)", {(t,) for _, t in pairs})
+    c.executemany('''INSERT OR IGNORE INTO entry_tags (entry_id, tag_id)
+                     SELECT ?, id FROM custom_tags WHERE tag_name = ?''', pairs)
+
+def bump_data_version(c, rebuild_context=False):
+    # Call inside the writing transaction so readers never see data without its version
+    c.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'data_version'")
+    if rebuild_context:
+        c.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'context_rebuild_version'")
+
+def _get_versions(conn):
+    versions = dict(conn.execute("SELECT key, value FROM app_meta"))
+    return versions['data_version'], versions['context_rebuild_version']
+
+def get_data_version():
+    with db.connection() as conn:
+        return _get_versions(conn)[0]
+
+MEDIA_COLUMNS = ['file_path', 'media_type', 'original_name', 'sha256', 'size_bytes', 'width', 'height', 'thumb_path']
+
+def _media_values(item):
+    # Media may be a plain (file_path, media_type) tuple or a media_store.ingest_upload record
+    if isinstance(item, dict):
+        return tuple(item.get(col) for col in MEDIA_COLUMNS)
+    file_path, media_type = item
+    return (file_path, media_type) + (None,) * (len(MEDIA_COLUMNS) - 2)
 
 # --- ENTRY OPERATIONS ---
 def add_entry(date, partner_name, social_media, notes, tags, media_files):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    tags_str = ", ".join(tags) if tags else ""
-    
     try:
-        c.execute('''INSERT INTO entries (date, partner_name, social_media, notes, tags)
-                     VALUES (?, ?, ?, ?, ?)''', (date, partner_name, social_media, notes, tags_str))
-        entry_id = c.lastrowid
-        
-        for file_path, media_type in media_files:
-            c.execute('''INSERT INTO media (entry_id, file_path, media_type)
-                         VALUES (?, ?, ?)''', (entry_id, file_path, media_type))
-        
-        conn.commit()
+        with db.transaction() as conn:
+            c = conn.cursor()
+            c.execute('''INSERT INTO entries (date, partner_name, social_media, notes)
+                         VALUES (?, ?, ?, ?)''', (date, partner_name, social_media, notes))
+            entry_id = c.lastrowid
+
+            link_tags(c, [(entry_id, t) for t in tags or []])
+            bump_data_version(c)
+
+            c.executemany(f'''INSERT INTO media (entry_id, {", ".join(MEDIA_COLUMNS)})
+                              VALUES (?, {", ".join("?" for _ in MEDIA_COLUMNS)})''',
+                          [(entry_id, *_media_values(item)) for item in media_files])
+
         return True, "Entry saved successfully!"
     except Exception as e:
         return False, str(e)
-    finally:
-        conn.close()
+
+def update_media_thumbnail(sha256, width, height, thumb_path):
+    # Fills in every row with this content, so a deduplicated upload gets the thumbnail too
+    with db.transaction() as conn:
+        cur = conn.execute('''UPDATE media SET width = ?, height = ?, thumb_path = ?
+                              WHERE sha256 = ? AND thumb_path IS NULL''', (width, height, thumb_path, sha256))
+        return cur.rowcount
 
 def get_all_entries():
-    conn = sqlite3.connect(DB_FILE)
-    query = "SELECT * FROM entries ORDER BY date DESC"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with db.connection() as conn:
+        query = f"SELECT {ENTRY_COLUMNS} FROM entries e ORDER BY e.date DESC"
+        df = db.read_frame(conn, query)
     return df
 
+def count_entries():
+    with db.connection() as conn:
+        return conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+
+def get_entries_page(page_size=20, cursor=None):
+    """Return (DataFrame, next_cursor) for one page of entries, newest first.
+
+    cursor is the (date, id) of the last row of the previous page; next_cursor
+    is None on the last page. Seeks on idx_entries_date_id, so the cost of a
+    page does not depend on how deep into the history it is.
+    """
+    sql = f"SELECT {ENTRY_COLUMNS} FROM entries e"
+    params = []
+    if cursor is not None:
+        sql += " WHERE (e.date, e.id) < (?, ?)"
+        params.extend(cursor)
+    sql += " ORDER BY e.date DESC, e.id DESC LIMIT ?"
+    # One extra row tells us whether another page exists
+    params.append(page_size + 1)
+
+    with db.connection() as conn:
+        df = db.read_frame(conn, sql, params=params)
+
+    next_cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        next_cursor = (last['date'], int(last['id']))
+    return df, next_cursor
+
+def get_media_for_entries(entry_ids):
+    """Batch media lookup for a page of entries: {entry_id: [media record dict, ...]}."""
+    entry_ids = [int(i) for i in entry_ids]
+    media = {entry_id: [] for entry_id in entry_ids}
+    with db.connection() as conn:
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(entry_ids), 500):
+            chunk = entry_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            c = conn.execute(f'''SELECT id, entry_id, {", ".join(MEDIA_COLUMNS)} FROM media
+                                  WHERE entry_id IN ({placeholders}) ORDER BY id''', chunk)
+            names = [d[0] for d in c.description]
+            for row in c:
+                record = dict(zip(names, row))
+                media[record['entry_id']].append(record)
+    return media
+
 def get_media_for_entry(entry_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT file_path, media_type FROM media WHERE entry_id = ?", (entry_id,))
-    media = c.fetchall()
-    conn.close()
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT file_path, media_type FROM media WHERE entry_id = ?", (entry_id,))
+        media = c.fetchall()
     return media
 
-def search_entries(query_text):
-    conn = sqlite3.connect(DB_FILE)
-    query = f"%{query_text}%"
-    sql = '''SELECT * FROM entries 
-             WHERE partner_name LIKE ? 
-             OR notes LIKE ? 
-             OR date LIKE ?
-             OR tags LIKE ?'''
-    df = pd.read_sql_query(sql, conn, params=(query, query, query, query))
-    conn.close()
+# Dropped from free-text queries so chat questions match on their content words
+SEARCH_STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "did", "do", "does",
+    "for", "from", "had", "has", "have", "how", "i", "in", "is", "it", "me", "my", "of",
+    "on", "or", "tell", "that", "the", "there", "was", "we", "were", "what", "when",
+    "where", "which", "who", "with", "you",
+}
+
+def _fts_query(query_text):
+    terms = [t for t in re.findall(r"\w+", query_text.lower()) if t not in SEARCH_STOPWORDS]
+    # Quoted prefix terms, OR-ed so multi-word questions still hit; bm25 sorts by relevance
+    return " OR ".join(f'"{t}"*' for t in dict.fromkeys(terms))
+
+def search_entries(query_text, limit=20):
+    match = _fts_query(query_text)
+    if not match:
+        import pandas as pd
+        return pd.DataFrame(columns=["id", "date", "partner_name", "social_media", "notes",
+                                     "created_at", "tags", "snippet", "rank"])
+    # Column weights: partner_name, notes, date, tags
+    sql = f'''SELECT {ENTRY_COLUMNS},
+                     snippet(entries_fts, 1, '**', '**', '…', 16) AS snippet,
+                     bm25(entries_fts, 5.0, 1.0, 1.0, 3.0) AS rank
+              FROM entries_fts
+              JOIN entries e ON e.id = entries_fts.rowid
+              WHERE entries_fts MATCH ?
+              ORDER BY rank
+              LIMIT ?'''
+    with db.connection() as conn:
+        df = db.read_frame(conn, sql, params=(match, limit))
+    return df
+
+def get_entries_with_tag(tag_name):
+    return get_entries_with_all_tags([tag_name])
+
+def get_entries_with_all_tags(tag_names):
+    tag_names = list(dict.fromkeys(tag_names))
+    if not tag_names:
+        return get_all_entries()
+    placeholders = ", ".join("?" for _ in tag_names)
+    # Resolved through idx_entry_tags_tag_id; entries matching every tag survive the HAVING
+    sql = f'''SELECT {ENTRY_COLUMNS} FROM entries e
+              WHERE e.id IN (SELECT et.entry_id FROM entry_tags et
+                             JOIN custom_tags t ON t.id = et.tag_id
+                             WHERE t.tag_name IN ({placeholders})
+                             GROUP BY et.entry_id
+                             HAVING count(*) = ?)
+              ORDER BY e.date DESC'''
+    with db.connection() as conn:
+        df = db.read_frame(conn, sql, params=(*tag_names, len(tag_names)))
+    return df
+
+def get_tag_counts():
+    sql = '''SELECT t.tag_name, count(et.entry_id) AS entry_count
+             FROM custom_tags t
+             LEFT JOIN entry_tags et ON et.tag_id = t.id
+             GROUP BY t.id
+             ORDER BY entry_count DESC, t.tag_name ASC'''
+    with db.connection() as conn:
+        df = db.read_frame(conn, sql)
     return df
 
+def _format_entries(df):
+    # One string per entry; multi-line notes keep their line breaks
+    cols = df[['date', 'partner_name', 'tags', 'notes']].fillna('').astype(str)
+    return ("Date: " + cols['date']
+            + ", Partner: " + cols['partner_name']
+            + ", Tags: " + cols['tags']
+            + ", Notes: " + cols['notes'])
+
+def _format_context(df):
+    if df.empty:
+        return ""
+    return "\n".join(_format_entries(df)) + "\n"
+
+# Full contexts kept in memory, one per database file (so per user), least recently used evicted
+MAX_CACHED_CONTEXTS = 16
+
+# Per database file: {'data_version', 'rebuild_version', 'last_id', 'context'}
+_context_cache = OrderedDict()
+_context_lock = threading.Lock()
+
 def get_all_context_for_ai():
-    df = get_all_entries()
-    context = ""
-    for index, row in df.iterrows():
-        context += f"Date: {row['date']}, Partner: {row['partner_name']}, Tags: {row['tags']}, Notes: {row['notes']}\n"
+    db_file = db.resolve()
+    with db.connection() as conn:
+        data_version, rebuild_version = _get_versions(conn)
+        with _context_lock:
+            cached = _context_cache.get(db_file)
+            if cached:
+                _context_cache.move_to_end(db_file)
+
+        if cached and cached['data_version'] == data_version:
+            return cached['context']
+
+        # Entries are listed in insertion order so new ones can simply be appended
+        if cached and cached['rebuild_version'] == rebuild_version:
+            df = db.read_frame(conn, f"SELECT {ENTRY_COLUMNS} FROM entries e WHERE e.id > ? ORDER BY e.id",
+                               params=(cached['last_id'],))
+            context = cached['context'] + _format_context(df)
+            last_id = cached['last_id']
+        else:
+            df = db.read_frame(conn, f"SELECT {ENTRY_COLUMNS} FROM entries e ORDER BY e.id")
+            context = _format_context(df)
+            last_id = 0
+
+    if not df.empty:
+        last_id = int(df['id'].iloc[-1])
+    with _context_lock:
+        _context_cache[db_file] = {
+            'data_version': data_version,
+            'rebuild_version': rebuild_version,
+            'last_id': last_id,
+            'context': context,
+        }
+        _context_cache.move_to_end(db_file)
+        while len(_context_cache) > MAX_CACHED_CONTEXTS:
+            _context_cache.popitem(last=False)
     return context
 
+# Upper bound on date-log tokens sent with a single AI request
+CONTEXT_TOKEN_BUDGET = 4000
+
+def estimate_tokens(text):
+    # Rough heuristic (~4 characters per token); good enough for budgeting
+    return len(text) // 4 + 1
+
+def _fill_budget(df, token_budget, seen_ids):
+    lines = []
+    used = 0
+    if df.empty:
+        return lines, used
+    df = df[~df['id'].isin(seen_ids)]
+    if df.empty:
+        return lines, used
+    # Whole entries only: budget is charged per entry, however many lines its notes span
+    for entry_id, text in zip(df['id'], _format_entries(df)):
+        line = text + "\n"
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+        seen_ids.add(entry_id)
+    return lines, used
+
+def entry_content_hash(date, partner_name, notes, tags):
+    # What an entry summary is written from; tag order doesn't matter
+    tag_list = sorted(t for t in (tags or "").split(", ") if t)
+    payload = json.dumps([date, partner_name, notes or "", tag_list])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _apply_summaries(conn, df):
+    # Swap raw notes for the entry's summary wherever one matches its current content
+    if df.empty:
+        return df
+    summaries = {}
+    ids = df['id'].tolist()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = conn.execute(f'''SELECT entry_id, content_hash, summary FROM entry_summaries
+                                WHERE entry_id IN ({", ".join("?" for _ in chunk)})''', chunk)
+        summaries.update((entry_id, (content_hash, summary)) for entry_id, content_hash, summary in rows)
+    if not summaries:
+        return df
+    notes = []
+    for entry_id, date, partner_name, note, tags in zip(df['id'], df['date'], df['partner_name'], df['notes'], df['tags']):
+        cached = summaries.get(entry_id)
+        fresh = cached and cached[0] == entry_content_hash(date, partner_name, note, tags)
+        notes.append(cached[1] if fresh else note)
+    df = df.copy()
+    df['notes'] = notes
+    return df
+
+def get_relevant_context_for_ai(query_text, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Date-log context for one question, capped at token_budget.
+
+    Small logs are sent whole. Larger ones send the bm25 top hits for the
+    question first, then fill any remaining budget with the most recent dates.
+    In that case entries with a current summary (see summarizer.py) are sent
+    as the summary instead of their raw notes, so more of them fit.
+    """
+    context = get_all_context_for_ai()
+    if estimate_tokens(context) <= token_budget:
+        return context
+
+    seen_ids = set()
+    with db.connection() as conn:
+        hits = _apply_summaries(conn, search_entries(query_text, limit=200))
+        lines, used = _fill_budget(hits, token_budget, seen_ids)
+
+        remaining = token_budget - used
+        if remaining > 0:
+            recent = db.read_frame(conn, f"SELECT {ENTRY_COLUMNS} FROM entries e ORDER BY e.date DESC, e.id DESC LIMIT 200")
+            more, _ = _fill_budget(_apply_summaries(conn, recent), remaining, seen_ids)
+            lines.extend(more)
+    return "".join(lines)
+
 # --- PROFILE OPERATIONS ---
 def get_user_profile():
-    conn = sqlite3.connect(DB_FILE)
-    # Using row_factory to get dictionary-like access if needed, but pandas is easier
-    df = pd.read_sql_query("SELECT * FROM user_profile WHERE id=1", conn)
-    conn.close()
-    if not df.empty:
-        return df.iloc[0].to_dict()
+    with db.connection() as conn:
+        c = conn.execute("SELECT * FROM user_profile WHERE id=1")
+        row = c.fetchone()
+    if row is not None:
+        return dict(zip([d[0] for d in c.description], row))
     return {}
 
 def update_user_profile(name, age, gender, goals, interests):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    # Upsert logic for SQLite
-    c.execute('''INSERT INTO user_profile (id, name, age, gender, dating_goals, interests)
-                 VALUES (1, ?, ?, ?, ?, ?)
-                 ON CONFLICT(id) DO UPDATE SET
-                 name=excluded.name,
-                 age=excluded.age,
-                 gender=excluded.gender,
-                 dating_goals=excluded.dating_goals,
-                 interests=excluded.interests
-              ''', (name, age, gender, goals, interests))
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        c = conn.cursor()
+        # Upsert logic for SQLite
+        c.execute('''INSERT INTO user_profile (id, name, age, gender, dating_goals, interests)
+                     VALUES (1, ?, ?, ?, ?, ?)
+                     ON CONFLICT(id) DO UPDATE SET
+                     name=excluded.name,
+                     age=excluded.age,
+                     gender=excluded.gender,
+                     dating_goals=excluded.dating_goals,
+                     interests=excluded.interests
+                  ''', (name, age, gender, goals, interests))
+        bump_data_version(c)
 
 # --- TAG OPERATIONS ---
 def get_custom_tags():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT tag_name FROM custom_tags ORDER BY tag_name ASC")
-    tags = [row[0] for row in c.fetchall()]
-    conn.close()
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT tag_name FROM custom_tags ORDER BY tag_name ASC")
+        tags = [row[0] for row in c.fetchall()]
     return tags
 
 def add_custom_tag(tag_name):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     try:
-        c.execute("INSERT INTO custom_tags (tag_name) VALUES (?)", (tag_name,))
-        conn.commit()
+        with db.transaction() as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO custom_tags (tag_name) VALUES (?)", (tag_name,))
+            bump_data_version(c)
         return True, "Tag added!"
     except sqlite3.IntegrityError:
         return False, "Tag already exists."
-    finally:
-        conn.close()
 
 def delete_custom_tag(tag_name):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM custom_tags WHERE tag_name = ?", (tag_name,))
-    conn.commit()
-    conn.close()
+    with db.transaction() as conn:
+        c = conn.cursor()
+        # Unlink from entries too, so no stale tag text survives the delete
+        c.execute("DELETE FROM entry_tags WHERE tag_id = (SELECT id FROM custom_tags WHERE tag_name = ?)", (tag_name,))
+        c.execute("DELETE FROM custom_tags WHERE tag_name = ?", (tag_name,))
+        # Already-logged entries lose the tag, so cached context must be rebuilt
+        bump_data_version(c, rebuild_context=True)
@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import tenancy
+
+DB_FILE = "date_log.db"
+
+# Idle connections kept per database file
+POOL_SIZE = 8
+# Idle connections kept across all database files (one per tenant); the least
+# recently used files are closed first when this is exceeded
+MAX_POOLED_CONNECTIONS = 64
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+_PRAGMAS = (
+    # Takes effect for new database files; existing ones are converted from Settings (maintenance.enable_incremental_vacuum)
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+_lock = threading.Lock()
+_pools = OrderedDict()  # db file -> idle connections, least recently used first
+_pooled_count = 0
+_local = threading.local()
+_trace_callback = None
+
+def _connect(db_file):
+    # isolation_level=None: we issue BEGIN ourselves in transaction()
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    if _trace_callback is not None:
+        conn.set_trace_callback(_trace_callback)
+    return conn
+
+def _acquire(db_file):
+    global _pooled_count
+    with _lock:
+        pool = _pools.get(db_file)
+        if pool:
+            _pooled_count -= 1
+            conn = pool.pop()
+            if not pool:
+                del _pools[db_file]
+            return conn
+    return _connect(db_file)
+
+def _release(db_file, conn):
+    global _pooled_count
+    if conn.in_transaction:
+        conn.rollback()
+    evicted = []
+    with _lock:
+        pool = _pools.setdefault(db_file, [])
+        _pools.move_to_end(db_file)
+        if len(pool) >= POOL_SIZE:
+            evicted.append(conn)
+        else:
+            pool.append(conn)
+            _pooled_count += 1
+        while _pooled_count > MAX_POOLED_CONNECTIONS:
+            oldest_file, oldest = next(iter(_pools.items()))
+            evicted.append(oldest.pop(0))
+            _pooled_count -= 1
+            if not oldest:
+                del _pools[oldest_file]
+    for idle in evicted:
+        idle.close()
+
+def resolve(db_file=None):
+    # The database file a call without an explicit db_file will use: the
+    # active tenant's own file, or the shared DB_FILE when no tenant is set
+    if db_file:
+        return db_file
+    return tenancy.db_path() if tenancy.current() else DB_FILE
+
+@contextmanager
+def connection(db_file=None):
+    """Check a pooled connection out for the duration of the block.
+
+    Nested calls on the same thread share the outer connection, so helpers
+    can be composed inside a transaction without deadlocking on the write lock.
+    """
+    db_file = resolve(db_file)
+    active = getattr(_local, "active", None)
+    if active is None:
+        active = _local.active = {}
+
+    if db_file in active:
+        conn, depth = active[db_file]
+        active[db_file] = (conn, depth + 1)
+        try:
+            yield conn
+        finally:
+            conn, depth = active[db_file]
+            active[db_file] = (conn, depth - 1)
+        return
+
+    conn = _acquire(db_file)
+    active[db_file] = (conn, 1)
+    try:
+        yield conn
+    finally:
+        del active[db_file]
+        _release(db_file, conn)
+
+@contextmanager
+def transaction(db_file=None):
+    """Run the block in a write transaction, committing on success.
+
+    BEGIN IMMEDIATE takes the write lock up front so concurrent writers wait
+    on busy_timeout instead of failing with "database is locked" mid-way.
+    An already open transaction on this thread is joined rather than nested.
+    """
+    with connection(db_file) as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+def read_frame(conn, sql, params=None):
+    # pandas costs ~0.5s to import, so it is only loaded once a DataFrame is actually needed
+    import pandas as pd
+    return pd.read_sql_query(sql, conn, params=params)
+
+def set_trace_callback(callback):
+    # Applied to idle pooled connections now and to every connection opened later
+    global _trace_callback
+    with _lock:
+        _trace_callback = callback
+        for pool in _pools.values():
+            for conn in pool:
+                conn.set_trace_callback(callback)
+
+def close_all():
+    global _pooled_count
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _pooled_count = 0
+    for pool in pools:
+        for conn in pool:
+            conn.close()
@@ -0,0 +1,94 @@
+import csv
+import importlib.util
+
+import db
+
+EXPORT_BATCH_SIZE = 1000
+
+# format -> (mime type, file extension)
+EXPORT_FORMATS = {
+    'csv': ("text/csv", ".csv"),
+    'xlsx': ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+    'parquet': ("application/vnd.apache.parquet", ".parquet"),
+}
+
+def available_formats():
+    # Parquet needs pyarrow, which is optional
+    formats = ['csv', 'xlsx']
+    if importlib.util.find_spec("pyarrow") is not None:
+        formats.append('parquet')
+    return formats
+
+def iter_entry_batches(include_tags=True, include_media=False, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (columns, rows) batches straight from SQLite, newest entries first.
+
+    Only one batch is held in memory at a time; the whole export reads from a
+    single snapshot of the database.
+    """
+    select = ["e.id", "e.date", "e.partner_name", "e.social_media", "e.notes", "e.created_at"]
+    if include_tags:
+        select.append('''COALESCE((SELECT group_concat(t.tag_name, ', ')
+                                   FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                                   WHERE et.entry_id = e.id), '') AS tags''')
+    if include_media:
+        select.append('''COALESCE((SELECT group_concat(m.file_path, '; ')
+                                   FROM media m WHERE m.entry_id = e.id), '') AS media_files''')
+    sql = f"SELECT {', '.join(select)} FROM entries e ORDER BY e.date DESC, e.id DESC"
+
+    with db.connection() as conn:
+        c = conn.execute(sql)
+        columns = [d[0] for d in c.description]
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, rows
+
+def export_csv(path, include_tags=True, include_media=False):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        header_written = False
+        for columns, rows in iter_entry_batches(include_tags, include_media):
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(rows)
+
+def export_xlsx(path, include_tags=True, include_media=False):
+    from openpyxl import Workbook
+
+    # write_only streams rows to disk instead of building the sheet in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Dates")
+    header_written = False
+    for columns, rows in iter_entry_batches(include_tags, include_media):
+        if not header_written:
+            ws.append(columns)
+            header_written = True
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+def export_parquet(path, include_tags=True, include_media=False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for columns, rows in iter_entry_batches(include_tags, include_media):
+            if writer is None:
+                schema = pa.schema([(col, pa.int64() if col == 'id' else pa.string()) for col in columns])
+                writer = pq.ParquetWriter(path, schema)
+            data = {col: [None if row[i] is None else (row[i] if col == 'id' else str(row[i])) for row in rows]
+                    for i, col in enumerate(columns)}
+            # Each batch becomes its own row group
+            writer.write_table(pa.table(data, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def export_entries(fmt, path, include_tags=True, include_media=False):
+    exporters = {'csv': export_csv, 'xlsx': export_xlsx, 'parquet': export_parquet}
+    if fmt not in exporters:
+        raise ValueError(f"Unknown export format: {fmt}")
+    exporters[fmt](path, include_tags=include_tags, include_media=include_media)
@@ -0,0 +1,231 @@
+import csv
+import hashlib
+import json
+import mimetypes
+import os
+import zipfile
+from datetime import date, datetime
+
+import data_manager as dm
+import db
+import media_store
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ['csv', 'json', 'jsonl', 'xlsx']
+
+# --- READERS ---
+# Each reader yields one dict per source row. CSV, JSONL and XLSX are streamed;
+# a JSON document has to be parsed whole, so use JSONL for very large exports.
+# Unreadable input raises ValueError saying what is wrong and where.
+_NOT_UTF8 = "The file is not UTF-8 text; re-save it with UTF-8 encoding and import it again."
+
+def _read_csv(path):
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    except UnicodeDecodeError:
+        raise ValueError(_NOT_UTF8) from None
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except UnicodeDecodeError:
+        raise ValueError(_NOT_UTF8) from None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON at line {e.lineno}, column {e.colno}: {e.msg}.") from None
+    if isinstance(data, dict):
+        data = data.get('entries', [])
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of entries, or an object with an 'entries' list.")
+    yield from data
+
+def _read_jsonl(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Line {line_number} is not valid JSON: {e.msg}.") from None
+    except UnicodeDecodeError:
+        raise ValueError(_NOT_UTF8) from None
+
+def _read_xlsx(path):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, OSError) as e:
+        raise ValueError(f"Not a readable .xlsx workbook ({e}).") from None
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+def read_rows(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    readers = {'csv': _read_csv, 'json': _read_json, 'jsonl': _read_jsonl, 'xlsx': _read_xlsx}
+    if fmt not in readers:
+        raise ValueError(f"Unsupported import format: {fmt}")
+    return readers[fmt](path)
+
+# --- VALIDATION ---
+def _split(value, sep):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(sep) if v.strip()]
+
+def _media_type(file_path):
+    mime = mimetypes.guess_type(file_path)[0] or ""
+    return mime.split("/")[0] or None
+
+def validate_row(row):
+    """Return (clean_row, None) or (None, error message)."""
+    if not isinstance(row, dict):
+        # JSON arrays and JSONL lines can hold anything
+        return None, f"row is not an object: {row!r:.80}"
+    row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+
+    partner_name = str(row.get('partner_name') or "").strip()
+    if not partner_name:
+        return None, "partner_name is required"
+
+    raw_date = row.get('date')
+    if isinstance(raw_date, datetime):
+        raw_date = raw_date.date()
+    if isinstance(raw_date, date):
+        entry_date = raw_date.isoformat()
+    else:
+        try:
+            entry_date = date.fromisoformat(str(raw_date or "").strip()[:10]).isoformat()
+        except ValueError:
+            return None, f"invalid date: {raw_date!r}"
+
+    media = [(p, _media_type(p)) for p in _split(row.get('media') or row.get('media_files'), ";")]
+    for path, _ in media:
+        if not media_store.is_allowed_path(path):
+            return None, f"media path outside the media folder: {path!r}"
+    return {
+        'date': entry_date,
+        'partner_name': partner_name,
+        'social_media': str(row.get('social_media') or "").strip(),
+        'notes': str(row.get('notes') or ""),
+        'tags': _split(row.get('tags'), ","),
+        'media': media,
+    }, None
+
+# --- CHECKPOINTS ---
+def source_key(path):
+    # Content hash, so a renamed copy of the same file still resumes
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def get_checkpoint(key):
+    with db.connection() as conn:
+        row = conn.execute("SELECT rows_done, completed FROM import_checkpoints WHERE source_key = ?",
+                           (key,)).fetchone()
+    return (row[0], bool(row[1])) if row else (0, False)
+
+# --- IMPORT ---
+def _next_entry_id(c):
+    # Respect AUTOINCREMENT's high-water mark so deleted ids are never reused
+    c.execute('''SELECT max(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'entries'), 0),
+                            COALESCE((SELECT max(id) FROM entries), 0))''')
+    return c.fetchone()[0] + 1
+
+def _write_batch(key, batch, rows_done, completed=False):
+    with db.transaction() as conn:
+        c = conn.cursor()
+        first_id = _next_entry_id(c)
+        ids = range(first_id, first_id + len(batch))
+        last_id = first_id + len(batch) - 1
+
+        # Index the batch in one statement below rather than row by row in triggers
+        c.execute("UPDATE app_meta SET value = 1 WHERE key = 'fts_sync_paused'")
+
+        c.executemany('''INSERT INTO entries (id, date, partner_name, social_media, notes)
+                         VALUES (?, ?, ?, ?, ?)''',
+                      [(entry_id, r['date'], r['partner_name'], r['social_media'], r['notes'])
+                       for entry_id, r in zip(ids, batch)])
+        dm.link_tags(c, [(entry_id, tag) for entry_id, r in zip(ids, batch) for tag in r['tags']])
+        c.executemany("INSERT INTO media (entry_id, file_path, media_type) VALUES (?, ?, ?)",
+                      [(entry_id, path, mtype) for entry_id, r in zip(ids, batch) for path, mtype in r['media']])
+        c.execute('''INSERT INTO entries_fts (rowid, partner_name, notes, date, tags)
+                     SELECT e.id, e.partner_name, e.notes, e.date,
+                            (SELECT group_concat(t.tag_name, ', ')
+                             FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                             WHERE et.entry_id = e.id)
+                     FROM entries e WHERE e.id BETWEEN ? AND ?''', (first_id, last_id))
+        c.execute("UPDATE app_meta SET value = 0 WHERE key = 'fts_sync_paused'")
+
+        # Checkpoint commits atomically with the rows it covers
+        c.execute('''INSERT INTO import_checkpoints (source_key, rows_done, completed, updated_at)
+                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                     ON CONFLICT(source_key) DO UPDATE SET
+                     rows_done=excluded.rows_done,
+                     completed=excluded.completed,
+                     updated_at=excluded.updated_at''', (key, rows_done, int(completed)))
+        if batch:
+            dm.bump_data_version(c)
+
+def import_rows(rows, key, batch_size=IMPORT_BATCH_SIZE, progress=None, resume=True):
+    """Bulk-load an iterable of row dicts, checkpointed under key.
+
+    Valid rows are written in batches, each in one transaction together with
+    a checkpoint, so an interrupted import resumes after the last committed
+    batch. Invalid rows are skipped and reported. progress, if given, is
+    called as progress(rows_read, imported, errors) after each batch.
+    Returns a summary dict.
+    """
+    start, completed = get_checkpoint(key) if resume else (0, False)
+    summary = {'imported': 0, 'resumed_from': start, 'errors': [], 'already_imported': completed}
+    if completed:
+        return summary
+
+    batch = []
+    rows_read = start
+    for row_number, row in enumerate(rows, start=1):
+        if row_number <= start:
+            continue
+        rows_read = row_number
+        clean, error = validate_row(row)
+        if error:
+            summary['errors'].append((row_number, error))
+            continue
+        batch.append(clean)
+        if len(batch) >= batch_size:
+            _write_batch(key, batch, rows_read)
+            summary['imported'] += len(batch)
+            batch = []
+            if progress:
+                progress(rows_read, summary['imported'], len(summary['errors']))
+
+    _write_batch(key, batch, rows_read, completed=True)
+    summary['imported'] += len(batch)
+    if progress:
+        progress(rows_read, summary['imported'], len(summary['errors']))
+    return summary
+
+def import_file(path, fmt=None, batch_size=IMPORT_BATCH_SIZE, progress=None, resume=True):
+    # Bulk-load entries, tags and media references from a CSV/JSON/JSONL/XLSX file.
+    # Raises ValueError if the file can't be read; batches before the problem stay imported.
+    key = source_key(path)
+    try:
+        return import_rows(read_rows(path, fmt), key, batch_size, progress, resume)
+    except ValueError as e:
+        rows_done, _ = get_checkpoint(key)
+        if rows_done:
+            raise ValueError(f"{e} The first {rows_done} rows were already imported; remove them from the file "
+                             "before importing it again.") from None
+        raise
@@ -0,0 +1,316 @@
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_utils
+import chat_manager as cm
+import conversation_memory
+import data_manager as dm
+import db
+import exporter
+import llm_backends
+import maintenance
+import media_store
+import summarizer
+
+# Worker threads per job kind, shared by every session and tenant in the process.
+# Kinds get separate pools so a queue of exports never holds up chat replies.
+CONCURRENCY = {
+    # Mostly waiting on the model; each API key's own quota is enforced by RATE_LIMITS
+    'ai_response': 32,
+    'thumbnail': os.cpu_count() or 1,
+    'export': 1,
+    'summarize': 1,
+    'maintenance': 1,
+    'vacuum': 1,
+}
+# (starts per second, burst) per API key for kinds that call a rate-limited service;
+# users bring their own keys, so one user's burst never delays another's replies
+RATE_LIMITS = {
+    'ai_response': (1.0, 5),
+}
+# Limiters kept for the most recently active keys; an idle key's bucket is full again anyway
+MAX_LIMITERS = 1024
+# Partial AI answers are written to jobs.progress at most this often
+PROGRESS_INTERVAL_S = 0.5
+# Finished jobs, and the files exports left behind, are deleted after this long
+RETENTION_DAYS = 7
+
+# Active jobs get their heartbeat refreshed this often by the process that owns them;
+# one not refreshed for LEASE_S was left behind by a process that has gone away
+HEARTBEAT_INTERVAL_S = 10
+LEASE_S = 60
+# Kinds any process may restart. The others need the submitting user's API key, which
+# is never stored, or (a full VACUUM) should only run when a user asks; orphaned ones
+# are marked interrupted for the user to resubmit.
+RESUMABLE_KINDS = ('thumbnail', 'export', 'maintenance')
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('done', 'failed', 'interrupted')
+
+# This process in jobs.owner; the random suffix keeps it unique when pids are reused
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_lock = threading.Lock()
+_executors = {}
+_limiters = OrderedDict()  # (kind, api_key) -> RateLimiter, least recently used first
+_last_resume = {}  # db file -> monotonic time of the last resume_pending() check
+_owned = {}  # db file -> ids of this process's queued/running jobs there
+_heartbeat = None
+
+def _executor(kind):
+    with _lock:
+        executor = _executors.get(kind)
+        if executor is None:
+            executor = _executors[kind] = ThreadPoolExecutor(max_workers=CONCURRENCY[kind],
+                                                             thread_name_prefix=f"job-{kind}")
+        return executor
+
+def _limiter(kind, api_key):
+    limits = RATE_LIMITS.get(kind)
+    if limits is None:
+        return None
+    key = (kind, api_key)
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = llm_backends.RateLimiter(*limits)
+            if len(_limiters) > MAX_LIMITERS:
+                _limiters.popitem(last=False)
+        else:
+            _limiters.move_to_end(key)
+        return limiter
+
+JOB_COLUMNS = "id, kind, ref, status, payload, progress, result, error, created_at, started_at, finished_at"
+
+def _row_to_job(row):
+    job = dict(zip(JOB_COLUMNS.split(", "), row))
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+# --- QUEUE ---
+def submit(kind, payload, ref=None, **runtime):
+    """Persist a job and hand it to its worker pool; returns the job id.
+
+    payload must be JSON-serializable and is stored. runtime keyword arguments
+    (e.g. api_key) go to the handler but are never written to the database.
+    ref groups jobs for lookups, e.g. "chat:<session_id>".
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    with db.transaction() as conn:
+        job_id = conn.execute("INSERT INTO jobs (kind, ref, payload, owner, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+                              (kind, ref, json.dumps(payload), OWNER_ID, time.time())).lastrowid
+    _dispatch(job_id, kind, runtime)
+    return job_id
+
+def _dispatch(job_id, kind, runtime):
+    with _lock:
+        _owned.setdefault(db.resolve(), set()).add(job_id)
+    _start_heartbeat()
+    # The copied context carries the active tenant, so the worker uses the submitter's database
+    context = contextvars.copy_context()
+    _executor(kind).submit(context.run, _execute, job_id, kind, runtime)
+
+def _execute(job_id, kind, runtime):
+    try:
+        limiter = _limiter(kind, runtime.get('api_key', ""))
+        if limiter is not None:
+            limiter.acquire()
+        with db.transaction() as conn:
+            # Skipped if our lease lapsed and another process reclaimed the job
+            row = conn.execute("SELECT payload FROM jobs WHERE id = ? AND status = 'queued' AND owner = ?",
+                               (job_id, OWNER_ID)).fetchone()
+            if row is None:
+                return
+            conn.execute("UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+        try:
+            result = HANDLERS[kind](job_id, json.loads(row[0]), **runtime)
+        except Exception as e:
+            _finish(job_id, 'failed', error=str(e))
+        else:
+            _finish(job_id, 'done', result=result)
+    finally:
+        with _lock:
+            _owned.get(db.resolve(), set()).discard(job_id)
+
+def _start_heartbeat():
+    global _heartbeat
+    with _lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_beat, name="job-heartbeat", daemon=True)
+            _heartbeat.start()
+
+def _beat():
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL_S)
+        with _lock:
+            db_files = [db_file for db_file, ids in _owned.items() if ids]
+        for db_file in db_files:
+            try:
+                with db.transaction(db_file) as conn:
+                    conn.execute('''UPDATE jobs SET heartbeat_at = ?
+                                    WHERE owner = ? AND status IN ('queued', 'running')''', (time.time(), OWNER_ID))
+            except Exception:
+                # A busy database only delays this beat; the lease spans several
+                pass
+
+def _finish(job_id, status, result=None, error=None):
+    with db.transaction() as conn:
+        conn.execute('''UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                        WHERE id = ?''', (status, json.dumps(result) if result is not None else None, error, job_id))
+
+def _set_progress(job_id, progress):
+    with db.transaction() as conn:
+        conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (progress, job_id))
+
+def get_job(job_id):
+    with db.connection() as conn:
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def get_jobs(ref, active_only=False):
+    sql = f"SELECT {JOB_COLUMNS} FROM jobs WHERE ref = ?"
+    if active_only:
+        sql += f" AND status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})"
+    sql += " ORDER BY id ASC"
+    params = (ref, *ACTIVE_STATUSES) if active_only else (ref,)
+    with db.connection() as conn:
+        return [_row_to_job(row) for row in conn.execute(sql, params)]
+
+def wait(job_id, timeout=None, poll_interval=0.05):
+    """Block until the job has finished and return it (for scripts; the app polls instead)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES:
+            return job
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"Job {job_id} still {job['status']} after {timeout}s")
+        time.sleep(poll_interval)
+
+def resume_pending():
+    """Take over jobs whose owning process has gone away.
+
+    Active jobs whose heartbeat is older than LEASE_S are re-dispatched when
+    their kind is in RESUMABLE_KINDS and marked 'interrupted' otherwise.
+    Checks each database file at most once per LEASE_S, so it is cheap to
+    call on every rerun. Returns the number of jobs re-dispatched.
+    """
+    db_file = db.resolve()
+    with _lock:
+        if db_file in _last_resume and time.monotonic() - _last_resume[db_file] < LEASE_S:
+            return 0
+        _last_resume[db_file] = time.monotonic()
+    prune()
+    now = time.time()
+    # Claimed inside the write lock, so two processes never take over the same job
+    with db.transaction() as conn:
+        orphaned = conn.execute('''SELECT id, kind FROM jobs WHERE status IN ('queued', 'running')
+                                   AND (owner IS NULL OR heartbeat_at < ?) ORDER BY id''',
+                                (now - LEASE_S,)).fetchall()
+        resumed = [(job_id, kind) for job_id, kind in orphaned if kind in RESUMABLE_KINDS]
+        conn.executemany('''UPDATE jobs SET status = 'queued', started_at = NULL, owner = ?, heartbeat_at = ?
+                            WHERE id = ?''', [(OWNER_ID, now, job_id) for job_id, _ in resumed])
+        conn.executemany('''UPDATE jobs SET status = 'interrupted', finished_at = CURRENT_TIMESTAMP,
+                            error = 'Interrupted by a restart before it finished.' WHERE id = ?''',
+                         [(job_id,) for job_id, kind in orphaned if kind not in RESUMABLE_KINDS])
+    for job_id, kind in resumed:
+        _dispatch(job_id, kind, {})
+    return len(resumed)
+
+def latest_job(ref):
+    with db.connection() as conn:
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE ref = ? ORDER BY id DESC LIMIT 1",
+                           (ref,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def prune(days=RETENTION_DAYS):
+    cutoff = f"-{days} days"
+    with db.transaction() as conn:
+        exports = conn.execute('''SELECT result FROM jobs WHERE kind = 'export' AND status = 'done'
+                                  AND finished_at < datetime('now', ?)''', (cutoff,)).fetchall()
+        conn.execute(f'''DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)})
+                         AND finished_at < datetime('now', ?)''', (*FINISHED_STATUSES, cutoff))
+    for (result,) in exports:
+        path = json.loads(result)['path']
+        if os.path.exists(path):
+            os.remove(path)
+
+# --- CHAT ---
+def reply_in_session(session_id, prompt, prompt_id, api_key="", on_progress=None):
+    """Answer a saved user message and save the reply; the chat flow behind 'ai_response' jobs.
+
+    on_progress(text_so_far) is called at most every PROGRESS_INTERVAL_S.
+    Returns (message_id, reply).
+    """
+    chunks = []
+    try:
+        context = dm.get_relevant_context_for_ai(prompt)
+        conversation = conversation_memory.build_conversation_context(
+            session_id, before_id=prompt_id, backend=ai_utils.get_model(api_key))
+        last_flush = time.monotonic()
+        for chunk in ai_utils.stream_ai_response(api_key, prompt, context, dm.get_user_profile(),
+                                                 context_version=dm.get_data_version(), conversation=conversation):
+            chunks.append(chunk)
+            if on_progress and time.monotonic() - last_flush >= PROGRESS_INTERVAL_S:
+                on_progress("".join(chunks))
+                last_flush = time.monotonic()
+    except Exception as e:
+        # Saved like any other reply so the user sees what went wrong
+        chunks.append(f"\n\nAI Error: {str(e)}")
+        cm.add_message(session_id, "assistant", "".join(chunks))
+        raise
+    reply = "".join(chunks)
+    return cm.add_message(session_id, "assistant", reply), reply
+
+# --- HANDLERS ---
+# handler(job_id, payload, **runtime) -> JSON-serializable result
+def _run_ai_response(job_id, payload, api_key=""):
+    message_id, _ = reply_in_session(payload['session_id'], payload['prompt'], payload['prompt_id'], api_key,
+                                     on_progress=lambda text: _set_progress(job_id, text))
+    return {'message_id': message_id}
+
+def _run_thumbnail(job_id, payload):
+    info = media_store.make_thumbnail(payload['file_path'], payload['sha256'])
+    if not info:
+        return {'updated': 0}
+    return {'updated': dm.update_media_thumbnail(payload['sha256'], **info), **info}
+
+def _run_export(job_id, payload):
+    mime, ext = exporter.EXPORT_FORMATS[payload['fmt']]
+    export_dir = os.path.join(os.path.dirname(db.resolve()), "exports")
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"date_log-{job_id}{ext}")
+    exporter.export_entries(payload['fmt'], path, payload['include_tags'], payload['include_media'])
+    return {'path': path, 'name': f"date_log{ext}", 'mime': mime}
+
+def _run_summaries(job_id, payload, api_key=""):
+    # The summarizer runs its own rate-limited model calls in parallel
+    def report(done, total):
+        _set_progress(job_id, f"{done}/{total}")
+    result = summarizer.summarize_all(api_key, force=payload.get('force', False), progress=report)
+    result['errors'] = result['errors'][:20]
+    return result
+
+def _run_maintenance(job_id, payload):
+    return maintenance.run_maintenance(force=payload.get('force', False))
+
+def _run_vacuum(job_id, payload):
+    return {'converted': maintenance.enable_incremental_vacuum()}
+
+HANDLERS = {
+    'ai_response': _run_ai_response,
+    'thumbnail': _run_thumbnail,
+    'export': _run_export,
+    'summarize': _run_summaries,
+    'maintenance': _run_maintenance,
+    'vacuum': _run_vacuum,
+}
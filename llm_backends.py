@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import threading
+import time
+
+GEMINI_MODEL = "gemini-1.5-flash"
+
+# "gemini" (default, official SDK), "gemini-rest" (plain HTTP, no SDK) or "local"
+# for the offline stand-in used by benchmarks and tests
+BACKEND = os.environ.get("DATE_LOGGER_LLM_BACKEND", "gemini")
+# Where "gemini-rest" sends requests; benchmarks/fake_gemini.py serves the same API locally
+GEMINI_BASE_URL = os.environ.get("DATE_LOGGER_GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+REQUEST_TIMEOUT_S = 60
+
+# Every backend exposes model_name, generate(prompt) -> str and stream(prompt) -> iterator of str
+
+class GeminiBackend:
+    # genai.configure is process-global, so configuring and building the model is serialized
+    _configure_lock = threading.Lock()
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        import google.generativeai as genai
+        from google.generativeai import client as genai_client
+
+        self.model_name = model_name
+        with self._configure_lock:
+            genai.configure(api_key=api_key)
+            self._model = genai.GenerativeModel(model_name)
+            # The model would otherwise fetch the process-wide client on its first call, after
+            # another key may have been configured; configure() just reset it, so this one is ours
+            self._model._client = genai_client.get_default_generative_client()
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+class GeminiRestBackend:
+    """Gemini over its REST API with only the standard library.
+
+    Same behaviour as GeminiBackend, but the endpoint is configurable, so it
+    can be pointed at a proxy or at a local fake server for load tests.
+    """
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL, base_url=None):
+        self.model_name = model_name
+        self._api_key = api_key
+        self._base_url = (base_url or GEMINI_BASE_URL).rstrip("/")
+
+    def _post(self, method, prompt, query=""):
+        import urllib.error
+        import urllib.request
+
+        request = urllib.request.Request(
+            f"{self._base_url}/v1beta/models/{self.model_name}:{method}{query}",
+            data=json.dumps({'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}).encode(),
+            headers={'Content-Type': "application/json", 'x-goog-api-key': self._api_key},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_S)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode(errors="replace")
+            try:
+                detail = json.loads(detail)['error']['message']
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise RuntimeError(f"Gemini API returned {e.code}: {detail}") from None
+
+    @staticmethod
+    def _text(response):
+        candidates = response.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts', [])
+        return "".join(part.get('text', "") for part in parts)
+
+    def generate(self, prompt):
+        with self._post("generateContent", prompt) as response:
+            return self._text(json.load(response))
+
+    def stream(self, prompt):
+        # Server-sent events: one "data: {json}" line per chunk
+        with self._post("streamGenerateContent", prompt, "?alt=sse") as response:
+            for line in response:
+                if line.startswith(b"data:"):
+                    text = self._text(json.loads(line[5:]))
+                    if text:
+                        yield text
+
+class LocalBackend:
+    """Deterministic offline stand-in: same prompt, same answer, no network.
+
+    latency is slept before the first chunk and chunk_delay between chunks,
+    so slow model endpoints can be simulated.
+    """
+
+    model_name = "local-echo"
+
+    def __init__(self, latency=0.0, chunk_delay=0.0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+
+    def _answer(self, prompt):
+        question = prompt.rsplit("USER QUESTION:", 1)[-1].strip()
+        logged = len(re.findall(r"^\s*Date: ", prompt, flags=re.MULTILINE))
+        return f"Looking at {logged} logged dates, here is my take on \"{question}\": keep doing what feels right."
+
+    def generate(self, prompt):
+        time.sleep(self.latency)
+        return self._answer(prompt)
+
+    def stream(self, prompt):
+        time.sleep(self.latency)
+        for word in re.findall(r"\S+\s*", self._answer(prompt)):
+            yield word
+            time.sleep(self.chunk_delay)
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until another start is allowed."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# One backend (and so one SDK client) per (backend name, API key)
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(api_key, name=None):
+    name = name or BACKEND
+    key = (name, api_key)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if name == "local":
+                backend = LocalBackend()
+            elif name == "gemini":
+                backend = GeminiBackend(api_key)
+            elif name == "gemini-rest":
+                backend = GeminiRestBackend(api_key)
+            else:
+                raise ValueError(f"Unknown LLM backend: {name}")
+            _backends[key] = backend
+    return backend
@@ -0,0 +1,181 @@
+import os
+import time
+
+import data_manager as dm
+import db
+import media_store
+
+# How often run_maintenance() is due, per database file
+MAINTENANCE_INTERVAL_S = 24 * 3600
+# Files this new are never swept: an upload is stored before its entry row is written
+ORPHAN_GRACE_S = 3600
+# Freed pages returned to the filesystem per maintenance run
+VACUUM_PAGES_PER_RUN = 10000
+
+# --- CASCADING DELETES ---
+# Children go first: foreign keys are enforced, and the tag/analytics triggers
+# read the entry row while its tag links are removed.
+def delete_entry(entry_id):
+    try:
+        with db.transaction() as conn:
+            c = conn.cursor()
+            media = c.execute("SELECT file_path, thumb_path FROM media WHERE entry_id = ?",
+                              (entry_id,)).fetchall()
+            c.execute("DELETE FROM entry_tags WHERE entry_id = ?", (entry_id,))
+            c.execute("DELETE FROM media WHERE entry_id = ?", (entry_id,))
+            c.execute("DELETE FROM entry_summaries WHERE entry_id = ?", (entry_id,))
+            c.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+            if not c.rowcount:
+                raise LookupError(f"Entry {entry_id} not found.")
+            # Removed lines can't be patched out of the cached context, so rebuild it
+            dm.bump_data_version(c, rebuild_context=True)
+            # Files may be shared (deduped uploads, legacy rows saved by original name); keep any still in use
+            unreferenced = [path for file_path, thumb_path in media for path in (file_path, thumb_path)
+                            if path and not c.execute("SELECT 1 FROM media WHERE file_path = ? OR thumb_path = ? LIMIT 1",
+                                                      (path, path)).fetchone()]
+        # Only files the app stored itself; imported rows may point at the user's own photos
+        for path in set(unreferenced):
+            if media_store.in_media_dir(path) and os.path.exists(path):
+                os.remove(path)
+        return True, "Entry deleted."
+    except Exception as e:
+        return False, str(e)
+
+def delete_sessions(session_ids):
+    """Delete chat sessions with their messages, summaries and finished jobs; returns the count."""
+    session_ids = [int(i) for i in session_ids]
+    deleted = 0
+    with db.transaction() as conn:
+        c = conn.cursor()
+        for start in range(0, len(session_ids), 500):
+            chunk = session_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            # messages/chat_summaries seek on their session_id indexes, jobs on (ref, id)
+            c.execute(f"DELETE FROM messages WHERE session_id IN ({placeholders})", chunk)
+            c.execute(f"DELETE FROM chat_summaries WHERE session_id IN ({placeholders})", chunk)
+            c.execute(f'''DELETE FROM jobs WHERE ref IN ({placeholders}) AND status NOT IN ('queued', 'running')''',
+                      [f"chat:{i}" for i in chunk])
+            c.execute(f"DELETE FROM chat_sessions WHERE id IN ({placeholders})", chunk)
+            deleted += c.rowcount
+    return deleted
+
+# --- RETENTION ---
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+def get_chat_retention_days():
+    with db.connection() as conn:
+        return _get_meta(conn, 'chat_retention_days')
+
+def set_chat_retention_days(days):
+    # 0 keeps chats forever
+    with db.transaction() as conn:
+        conn.execute("UPDATE app_meta SET value = ? WHERE key = 'chat_retention_days'", (max(0, int(days)),))
+
+def expired_sessions(days):
+    # Last activity is the newest message (one index seek per session), or creation for empty chats
+    with db.connection() as conn:
+        rows = conn.execute('''SELECT s.id FROM chat_sessions s
+                               WHERE COALESCE((SELECT m.timestamp FROM messages m WHERE m.session_id = s.id
+                                               ORDER BY m.id DESC LIMIT 1), s.created_at)
+                                     < datetime('now', ?)''', (f"-{int(days)} days",)).fetchall()
+    return [row[0] for row in rows]
+
+def apply_chat_retention(days=None):
+    days = get_chat_retention_days() if days is None else days
+    if not days:
+        return 0
+    return delete_sessions(expired_sessions(days))
+
+# --- MEDIA ---
+def sweep_orphaned_media(dry_run=False):
+    """Remove files under the media directory that no media row references.
+
+    Returns {'files': n, 'bytes': size}. Files younger than ORPHAN_GRACE_S
+    are kept, so uploads still waiting for their entry are never touched.
+    """
+    root = media_store.media_dir()
+    swept = {'files': 0, 'bytes': 0}
+    if not os.path.isdir(root):
+        return swept
+    with db.connection() as conn:
+        referenced = {os.path.normpath(path) for (path,) in conn.execute(
+            "SELECT file_path FROM media UNION SELECT thumb_path FROM media WHERE thumb_path IS NOT NULL")}
+
+    cutoff = time.time() - ORPHAN_GRACE_S
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.normpath(os.path.join(dirpath, name))
+            if path in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.remove(path)
+            swept['files'] += 1
+            swept['bytes'] += stat.st_size
+    return swept
+
+# --- STORAGE ---
+def incremental_vacuum_enabled():
+    with db.connection() as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def enable_incremental_vacuum():
+    """Switch a database created before auto_vacuum was set; returns False if already on.
+
+    This needs one full VACUUM, which rewrites the whole file under an exclusive
+    lock and briefly needs about twice its disk space, so it only runs when the
+    user asks for it (Settings), never from scheduled maintenance.
+    """
+    if incremental_vacuum_enabled():
+        return False
+    with db.connection() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+def compact_and_analyze(max_pages=VACUUM_PAGES_PER_RUN):
+    """Return freed pages to the filesystem and refresh planner statistics."""
+    with db.connection() as conn:
+        freed = 0
+        # A no-op on databases still without incremental auto-vacuum (see enable_incremental_vacuum)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # execute() steps this pragma once, freeing a single page; executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        # First run gathers statistics; later runs only re-analyze tables that changed a lot
+        conn.execute("ANALYZE" if not has_stats else "PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return freed
+
+# --- SCHEDULING ---
+def is_due(interval=MAINTENANCE_INTERVAL_S):
+    with db.connection() as conn:
+        return time.time() - _get_meta(conn, 'last_maintenance_at') >= interval
+
+def run_maintenance(force=False, interval=MAINTENANCE_INTERVAL_S):
+    """Retention, orphan sweep, incremental vacuum and ANALYZE; at most once per interval per database.
+
+    Returns a report dict, or None when not due (or another process claimed it).
+    """
+    now = int(time.time())
+    with db.transaction() as conn:
+        last = _get_meta(conn, 'last_maintenance_at')
+        if not force and now - last < interval:
+            return None
+        # Claimed inside the write lock, so concurrent callers don't both run it
+        conn.execute("UPDATE app_meta SET value = ? WHERE key = 'last_maintenance_at'", (now,))
+
+    start = time.perf_counter()
+    report = {
+        'sessions_deleted': apply_chat_retention(),
+        'media_swept': sweep_orphaned_media(),
+    }
+    report['pages_freed'] = compact_and_analyze()
+    report['duration_s'] = round(time.perf_counter() - start, 3)
+    return report
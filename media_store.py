@@ -0,0 +1,110 @@
+import hashlib
+import os
+import tempfile
+
+import tenancy
+
+MEDIA_DIR = "media"
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = (320, 320)
+
+def media_dir():
+    # Per-tenant when a tenant is active, so users never share (or dedupe against) each other's files
+    return os.path.join(tenancy.tenant_dir(), MEDIA_DIR) if tenancy.current() else MEDIA_DIR
+
+# Extra directories (os.pathsep-separated) that imported entries may reference media in,
+# e.g. a photo library. Every user of the deployment can view files under them.
+MEDIA_IMPORT_ROOTS = [p for p in os.environ.get("DATE_LOGGER_MEDIA_ROOTS", "").split(os.pathsep) if p]
+
+def _is_under(path, root):
+    root = os.path.realpath(root)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+def in_media_dir(path):
+    return _is_under(path, media_dir())
+
+def is_allowed_path(path):
+    """Whether the active user may store and view a media file at path.
+
+    Only their own media directory and MEDIA_IMPORT_ROOTS qualify, so an
+    imported row can't point at server files or another user's media.
+    """
+    return in_media_dir(path) or any(_is_under(path, root) for root in MEDIA_IMPORT_ROOTS)
+
+def _content_path(digest, ext):
+    # Two-level fan-out keeps directories small; identical content always lands on the same path
+    return os.path.join(media_dir(), digest[:2], digest + ext)
+
+def make_thumbnail(file_path, digest):
+    """Return width/height/thumb_path for an image, or {} if it can't be read.
+
+    Pillow ships with Streamlit, but thumbnails are an optimization only, so a
+    missing or failing Pillow just means the full image is shown instead.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    thumb_path = os.path.join(media_dir(), "thumbs", digest + ".jpg")
+    try:
+        with Image.open(file_path) as img:
+            width, height = img.size
+            if not os.path.exists(thumb_path):
+                os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+                img.thumbnail(THUMBNAIL_SIZE)
+                img.convert("RGB").save(thumb_path, "JPEG", quality=80, optimize=True)
+    except Exception:
+        return {}
+    return {'width': width, 'height': height, 'thumb_path': thumb_path}
+
+def ingest_upload(uploaded_file, media_type, thumbnail=True):
+    """Stream an uploaded file into content-addressed storage.
+
+    Returns a media record for dm.add_entry. The upload is copied in
+    CHUNK_SIZE pieces while hashing, so large videos are never buffered whole.
+    With thumbnail=False image thumbnails are left to a background job.
+    """
+    os.makedirs(media_dir(), exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=media_dir(), prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            uploaded_file.seek(0)
+            while True:
+                chunk = uploaded_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        digest = hasher.hexdigest()
+        ext = os.path.splitext(uploaded_file.name)[1].lower()
+        final_path = _content_path(digest, ext)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if os.path.exists(final_path):
+            # Already stored: dedupe
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    record = {
+        'file_path': final_path,
+        'media_type': media_type,
+        'original_name': uploaded_file.name,
+        'sha256': digest,
+        'size_bytes': size,
+        'width': None,
+        'height': None,
+        'thumb_path': None,
+    }
+    if thumbnail and media_type == 'image':
+        record.update(make_thumbnail(final_path, digest))
+    return record
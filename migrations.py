@@ -0,0 +1,377 @@
+import threading
+
+import db
+
+# Schema changes are applied once per database file, tracked in PRAGMA user_version.
+# Append new steps to MIGRATIONS; never edit or reorder a step that has shipped.
+
+DEFAULT_TAGS = [
+    "Good Conversation", "Shared Hobbies", "Great Sense of Humor",
+    "Attractive", "Good Food", "Romantic Connection",
+    "Awkward Silence", "No Chemistry", "Red Flag", "Casual/Friends",
+    "Intellectual", "Outdoorsy", "Artsy"
+]
+
+# --- MIGRATION STEPS ---
+def _baseline_schema(c):
+    # Idempotent so databases created before versioning (user_version 0) upgrade cleanly
+    c.execute('''CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date TEXT NOT NULL,
+                    partner_name TEXT NOT NULL,
+                    social_media TEXT,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+    c.execute("PRAGMA table_info(entries)")
+    columns = [info[1] for info in c.fetchall()]
+    if 'tags' not in columns:
+        c.execute("ALTER TABLE entries ADD COLUMN tags TEXT")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS media (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entry_id INTEGER,
+                    file_path TEXT NOT NULL,
+                    media_type TEXT,
+                    FOREIGN KEY (entry_id) REFERENCES entries (id)
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS user_profile (
+                    id INTEGER PRIMARY KEY DEFAULT 1,
+                    name TEXT,
+                    age INTEGER,
+                    gender TEXT,
+                    dating_goals TEXT,
+                    interests TEXT
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS custom_tags (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tag_name TEXT UNIQUE
+                )''')
+
+    c.execute("SELECT count(*) FROM custom_tags")
+    if c.fetchone()[0] == 0:
+        c.executemany("INSERT OR IGNORE INTO custom_tags (tag_name) VALUES (?)", [(t,) for t in DEFAULT_TAGS])
+
+    c.execute('''CREATE TABLE IF NOT EXISTS chat_sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id INTEGER,
+                    role TEXT,
+                    content TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
+                )''')
+
+def _add_lookup_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_entry_id ON media (entry_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entries_date ON entries (date)")
+
+def _normalize_entry_tags(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS entry_tags (
+                    entry_id INTEGER NOT NULL,
+                    tag_id INTEGER NOT NULL,
+                    PRIMARY KEY (entry_id, tag_id),
+                    FOREIGN KEY (entry_id) REFERENCES entries (id),
+                    FOREIGN KEY (tag_id) REFERENCES custom_tags (id)
+                ) WITHOUT ROWID''')
+    # The primary key covers lookups by entry; this one covers lookups by tag
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entry_tags_tag_id ON entry_tags (tag_id, entry_id)")
+
+    # Move the legacy ", "-joined tags column into the join table
+    c.execute("SELECT id, tags FROM entries WHERE tags IS NOT NULL AND tags != ''")
+    links = []
+    for entry_id, tags_str in c.fetchall():
+        for tag in tags_str.split(", "):
+            tag = tag.strip()
+            if tag:
+                links.append((entry_id, tag))
+    c.executemany("INSERT OR IGNORE INTO custom_tags (tag_name) VALUES (?)", [(tag,) for _, tag in links])
+    c.executemany('''INSERT OR IGNORE INTO entry_tags (entry_id, tag_id)
+                     SELECT ?, id FROM custom_tags WHERE tag_name = ?''', links)
+    c.execute("UPDATE entries SET tags = NULL")
+
+def _add_entries_fts(c):
+    # Standalone FTS5 table keyed by entry id; tags are denormalized into it
+    # from entry_tags so a single MATCH covers every searchable field
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                    partner_name, notes, date, tags,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )''')
+    c.execute('''INSERT INTO entries_fts (rowid, partner_name, notes, date, tags)
+                 SELECT e.id, e.partner_name, e.notes, e.date,
+                        (SELECT group_concat(t.tag_name, ', ')
+                         FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                         WHERE et.entry_id = e.id)
+                 FROM entries e''')
+
+    c.execute('''CREATE TRIGGER IF NOT EXISTS entries_fts_ai AFTER INSERT ON entries BEGIN
+                    INSERT INTO entries_fts (rowid, partner_name, notes, date)
+                    VALUES (new.id, new.partner_name, new.notes, new.date);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS entries_fts_au AFTER UPDATE OF partner_name, notes, date ON entries BEGIN
+                    UPDATE entries_fts SET partner_name = new.partner_name, notes = new.notes, date = new.date
+                    WHERE rowid = new.id;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS entries_fts_ad AFTER DELETE ON entries BEGIN
+                    DELETE FROM entries_fts WHERE rowid = old.id;
+                 END''')
+
+    refresh_tags = '''UPDATE entries_fts SET tags = (SELECT group_concat(t.tag_name, ', ')
+                                                   FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                                                   WHERE et.entry_id = {row}.entry_id)
+                      WHERE rowid = {row}.entry_id;'''
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS entry_tags_fts_ai AFTER INSERT ON entry_tags BEGIN
+                     {refresh_tags.format(row="new")}
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS entry_tags_fts_ad AFTER DELETE ON entry_tags BEGIN
+                     {refresh_tags.format(row="old")}
+                  END''')
+
+def _add_history_paging_index(c):
+    # Covers the History tab's keyset order (date DESC, id DESC); supersedes idx_entries_date
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entries_date_id ON entries (date, id)")
+    c.execute("DROP INDEX IF EXISTS idx_entries_date")
+
+def _add_app_meta(c):
+    # data_version: bumped by every write; context_rebuild_version: bumped by writes
+    # that change already-logged entries, so cached AI context can't just be appended to
+    c.execute('''CREATE TABLE IF NOT EXISTS app_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )''')
+    c.executemany("INSERT OR IGNORE INTO app_meta (key, value) VALUES (?, 0)",
+                  [("data_version",), ("context_rebuild_version",)])
+
+def _add_media_metadata(c):
+    c.execute("PRAGMA table_info(media)")
+    columns = [info[1] for info in c.fetchall()]
+    for name, ddl in [("original_name", "TEXT"), ("sha256", "TEXT"), ("size_bytes", "INTEGER"),
+                      ("width", "INTEGER"), ("height", "INTEGER"), ("thumb_path", "TEXT")]:
+        if name not in columns:
+            c.execute(f"ALTER TABLE media ADD COLUMN {name} {ddl}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_sha256 ON media (sha256)")
+
+def _add_import_checkpoints(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS import_checkpoints (
+                    source_key TEXT PRIMARY KEY,
+                    rows_done INTEGER NOT NULL DEFAULT 0,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+def _add_fts_bulk_mode(c):
+    # Bulk writers set fts_sync_paused inside their own transaction and index the
+    # batch with one INSERT ... SELECT; per-row tag triggers would rewrite each FTS row
+    c.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('fts_sync_paused', 0)")
+    active = "WHEN (SELECT value FROM app_meta WHERE key = 'fts_sync_paused') = 0"
+
+    c.execute("DROP TRIGGER IF EXISTS entries_fts_ai")
+    c.execute(f'''CREATE TRIGGER entries_fts_ai AFTER INSERT ON entries {active} BEGIN
+                     INSERT INTO entries_fts (rowid, partner_name, notes, date)
+                     VALUES (new.id, new.partner_name, new.notes, new.date);
+                  END''')
+
+    refresh_tags = '''UPDATE entries_fts SET tags = (SELECT group_concat(t.tag_name, ', ')
+                                                   FROM entry_tags et JOIN custom_tags t ON t.id = et.tag_id
+                                                   WHERE et.entry_id = {row}.entry_id)
+                      WHERE rowid = {row}.entry_id;'''
+    for name, event, row in [("entry_tags_fts_ai", "INSERT", "new"), ("entry_tags_fts_ad", "DELETE", "old")]:
+        c.execute(f"DROP TRIGGER IF EXISTS {name}")
+        c.execute(f'''CREATE TRIGGER {name} AFTER {event} ON entry_tags {active} BEGIN
+                         {refresh_tags.format(row=row)}
+                      END''')
+
+def _add_message_window_index(c):
+    # Serves "latest N messages of a session" and older-page seeks; supersedes idx_messages_session_id
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id_id ON messages (session_id, id)")
+    c.execute("DROP INDEX IF EXISTS idx_messages_session_id")
+
+def _add_chat_summaries(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS chat_summaries (
+                    session_id INTEGER PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    summarized_through_id INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
+                )''')
+
+def _add_analytics_tables(c):
+    # Aggregates kept current by triggers, so every writer (form, importer, deletes) maintains them
+    c.execute('''CREATE TABLE IF NOT EXISTS partner_stats (
+                    partner_name TEXT PRIMARY KEY,
+                    date_count INTEGER NOT NULL,
+                    first_date TEXT,
+                    last_date TEXT
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS tag_monthly_counts (
+                    tag_id INTEGER NOT NULL,
+                    month TEXT NOT NULL,
+                    entry_count INTEGER NOT NULL,
+                    PRIMARY KEY (tag_id, month)
+                ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS tag_pair_counts (
+                    tag_a INTEGER NOT NULL,
+                    tag_b INTEGER NOT NULL,
+                    entry_count INTEGER NOT NULL,
+                    PRIMARY KEY (tag_a, tag_b)
+                ) WITHOUT ROWID''')
+    # Lets partner_stats recompute first/last dates on delete without a scan
+    c.execute("CREATE INDEX IF NOT EXISTS idx_entries_partner_date ON entries (partner_name, date)")
+
+    c.execute("DELETE FROM partner_stats")
+    c.execute('''INSERT INTO partner_stats (partner_name, date_count, first_date, last_date)
+                 SELECT partner_name, count(*), min(date), max(date) FROM entries GROUP BY partner_name''')
+    c.execute("DELETE FROM tag_monthly_counts")
+    c.execute('''INSERT INTO tag_monthly_counts (tag_id, month, entry_count)
+                 SELECT et.tag_id, substr(e.date, 1, 7), count(*)
+                 FROM entry_tags et JOIN entries e ON e.id = et.entry_id
+                 GROUP BY et.tag_id, substr(e.date, 1, 7)''')
+    c.execute("DELETE FROM tag_pair_counts")
+    c.execute('''INSERT INTO tag_pair_counts (tag_a, tag_b, entry_count)
+                 SELECT a.tag_id, b.tag_id, count(*)
+                 FROM entry_tags a JOIN entry_tags b ON b.entry_id = a.entry_id AND b.tag_id > a.tag_id
+                 GROUP BY a.tag_id, b.tag_id''')
+
+    partner_add = '''INSERT INTO partner_stats (partner_name, date_count, first_date, last_date)
+                     VALUES (new.partner_name, 1, new.date, new.date)
+                     ON CONFLICT(partner_name) DO UPDATE SET
+                     date_count = date_count + 1,
+                     first_date = min(first_date, excluded.first_date),
+                     last_date = max(last_date, excluded.last_date);'''
+    partner_remove = '''UPDATE partner_stats SET
+                        date_count = date_count - 1,
+                        first_date = (SELECT min(date) FROM entries WHERE partner_name = old.partner_name),
+                        last_date = (SELECT max(date) FROM entries WHERE partner_name = old.partner_name)
+                        WHERE partner_name = old.partner_name;
+                        DELETE FROM partner_stats WHERE partner_name = old.partner_name AND date_count <= 0;'''
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS entries_stats_ai AFTER INSERT ON entries BEGIN {partner_add} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS entries_stats_ad AFTER DELETE ON entries BEGIN {partner_remove} END")
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS entries_stats_au AFTER UPDATE OF partner_name, date ON entries BEGIN
+                     {partner_remove}
+                     {partner_add}
+                     UPDATE tag_monthly_counts SET entry_count = entry_count - 1
+                     WHERE month = substr(old.date, 1, 7) AND tag_id IN (SELECT tag_id FROM entry_tags WHERE entry_id = old.id);
+                     INSERT INTO tag_monthly_counts (tag_id, month, entry_count)
+                     SELECT tag_id, substr(new.date, 1, 7), 1 FROM entry_tags WHERE entry_id = new.id
+                     ON CONFLICT(tag_id, month) DO UPDATE SET entry_count = entry_count + 1;
+                     DELETE FROM tag_monthly_counts WHERE month = substr(old.date, 1, 7) AND entry_count <= 0;
+                  END''')
+
+    c.execute('''CREATE TRIGGER IF NOT EXISTS entry_tags_stats_ai AFTER INSERT ON entry_tags BEGIN
+                    INSERT INTO tag_monthly_counts (tag_id, month, entry_count)
+                    VALUES (new.tag_id, (SELECT substr(date, 1, 7) FROM entries WHERE id = new.entry_id), 1)
+                    ON CONFLICT(tag_id, month) DO UPDATE SET entry_count = entry_count + 1;
+                    INSERT INTO tag_pair_counts (tag_a, tag_b, entry_count)
+                    SELECT min(new.tag_id, tag_id), max(new.tag_id, tag_id), 1
+                    FROM entry_tags WHERE entry_id = new.entry_id AND tag_id != new.tag_id
+                    ON CONFLICT(tag_a, tag_b) DO UPDATE SET entry_count = entry_count + 1;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS entry_tags_stats_ad AFTER DELETE ON entry_tags BEGIN
+                    UPDATE tag_monthly_counts SET entry_count = entry_count - 1
+                    WHERE tag_id = old.tag_id AND month = (SELECT substr(date, 1, 7) FROM entries WHERE id = old.entry_id);
+                    UPDATE tag_pair_counts SET entry_count = entry_count - 1
+                    WHERE (tag_a, tag_b) IN (SELECT min(old.tag_id, tag_id), max(old.tag_id, tag_id)
+                                             FROM entry_tags WHERE entry_id = old.entry_id AND tag_id != old.tag_id);
+                    DELETE FROM tag_monthly_counts WHERE tag_id = old.tag_id AND entry_count <= 0;
+                    DELETE FROM tag_pair_counts WHERE (tag_a = old.tag_id OR tag_b = old.tag_id) AND entry_count <= 0;
+                 END''')
+
+def _add_jobs(c):
+    # Background work (AI replies, thumbnails, exports) survives reruns and restarts
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    ref TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    payload TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP
+                )''')
+    # "What is still running for this chat/page" and "what to resume at startup"
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ref_id ON jobs (ref, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+def _add_entry_summaries(c):
+    # One model-written summary per entry; content_hash says which version of the entry it describes
+    c.execute('''CREATE TABLE IF NOT EXISTS entry_summaries (
+                    entry_id INTEGER PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    model_name TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (entry_id) REFERENCES entries (id)
+                )''')
+
+def _add_maintenance_settings(c):
+    # chat_retention_days = 0 keeps chats forever; last_maintenance_at is a unix timestamp
+    c.executemany("INSERT OR IGNORE INTO app_meta (key, value) VALUES (?, 0)",
+                  [("chat_retention_days",), ("last_maintenance_at",)])
+
+def _add_job_owners(c):
+    # owner is the process that dispatched a job; heartbeat_at (unix time) shows it is still alive
+    c.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+    c.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+def _add_media_path_indexes(c):
+    # Deleting an entry checks whether any other row still uses each of its files
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_file_path ON media (file_path)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_thumb_path ON media (thumb_path)")
+
+MIGRATIONS = [
+    _baseline_schema,
+    _add_lookup_indexes,
+    _normalize_entry_tags,
+    _add_entries_fts,
+    _add_history_paging_index,
+    _add_app_meta,
+    _add_media_metadata,
+    _add_import_checkpoints,
+    _add_fts_bulk_mode,
+    _add_message_window_index,
+    _add_chat_summaries,
+    _add_analytics_tables,
+    _add_jobs,
+    _add_entry_summaries,
+    _add_maintenance_settings,
+    _add_job_owners,
+    _add_media_path_indexes,
+]
+
+# --- RUNNER ---
+_lock = threading.Lock()
+_migrated = set()
+
+def schema_version(db_file=None):
+    with db.connection(db_file) as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(db_file=None):
+    db_file = db.resolve(db_file)
+    # Fast path: Streamlit calls this on every rerun
+    if db_file in _migrated:
+        return
+
+    with _lock:
+        if db_file in _migrated:
+            return
+        with db.transaction(db_file) as conn:
+            # Re-read inside the write lock so concurrent processes don't both apply a step
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            c = conn.cursor()
+            for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+                step(c)
+                c.execute(f"PRAGMA user_version = {number}")
+        _migrated.add(db_file)
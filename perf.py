@@ -0,0 +1,163 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import db
+
+# Off by default. When off nothing is wrapped and no SQLite trace hook is installed,
+# so instrumented code runs exactly as it would without this module.
+ENABLED = os.environ.get("DATE_LOGGER_PERF") == "1"
+
+# Module name -> short label used in reports
+INSTRUMENTED_MODULES = {
+    'data_manager': 'dm',
+    'chat_manager': 'cm',
+    'ai_utils': 'ai',
+    'migrations': 'migrations',
+    'analytics': 'analytics',
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_originals = {}  # (module, attr) -> original function
+_totals = {}     # name -> stats, process-wide since enable()
+
+def _new_stats():
+    return {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'queries': 0}
+
+def _record(table, name, elapsed_ms=None, queries=0):
+    stats = table.setdefault(name, _new_stats())
+    if elapsed_ms is not None:
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    stats['queries'] += queries
+
+def _observe(name, elapsed_ms=None, queries=0):
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        _record(run, name, elapsed_ms, queries)
+    with _lock:
+        _record(_totals, name, elapsed_ms, queries)
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+@contextmanager
+def section(name):
+    """Time a block; SQL statements run inside it are counted against name."""
+    if not ENABLED:
+        yield
+        return
+    stack = _stack()
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        _observe(name, (time.perf_counter() - start) * 1000)
+
+def _on_sql(statement):
+    # SQLite trace hook; runs on the thread that issued the statement.
+    # Statements run by triggers are reported as "-- TRIGGER ..." and not counted.
+    if statement.startswith("--"):
+        return
+    stack = _stack()
+    _observe(stack[-1] if stack else "(untracked)", queries=1)
+
+def _wrap(name, fn):
+    if inspect.isgeneratorfunction(fn):
+        # Streaming calls are timed until the consumer finishes iterating
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            with section(name):
+                yield from fn(*args, **kwargs)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with section(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def enable():
+    """Wrap public functions of the instrumented modules and count SQL statements."""
+    global ENABLED
+    import importlib
+
+    ENABLED = True
+    for module_name, label in INSTRUMENTED_MODULES.items():
+        module = importlib.import_module(module_name)
+        for attr, fn in list(vars(module).items()):
+            if (attr.startswith("_") or not inspect.isfunction(fn)
+                    or fn.__module__ != module.__name__ or (module, attr) in _originals):
+                continue
+            _originals[(module, attr)] = fn
+            setattr(module, attr, _wrap(f"{label}.{attr}", fn))
+    db.set_trace_callback(_on_sql)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    for (module, attr), fn in _originals.items():
+        setattr(module, attr, fn)
+    _originals.clear()
+    db.set_trace_callback(None)
+
+# --- PER-RERUN COLLECTION ---
+def start_run():
+    _local.run = {}
+    _local.run_started = time.perf_counter()
+
+def finish_run():
+    """Stop collecting on this thread and return its records, slowest first."""
+    run = getattr(_local, 'run', None)
+    started = getattr(_local, 'run_started', None)
+    _local.run = None
+    if run is None:
+        return []
+    records = [{'name': name, **stats} for name, stats in run.items()]
+    records.append({'name': 'rerun', **_new_stats(), 'calls': 1,
+                    'total_ms': (time.perf_counter() - started) * 1000,
+                    'queries': sum(r['queries'] for r in records)})
+    for record in records:
+        record['total_ms'] = round(record['total_ms'], 3)
+        record['max_ms'] = round(record['max_ms'], 3)
+    return sorted(records, key=lambda r: r['total_ms'], reverse=True)
+
+def totals():
+    with _lock:
+        return {name: dict(stats) for name, stats in _totals.items()}
+
+def reset_totals():
+    with _lock:
+        _totals.clear()
+
+# --- EXPORT ---
+def to_jsonl(records, **labels):
+    ts = time.time()
+    return "".join(json.dumps({'ts': ts, **labels, **record}) + "\n" for record in records)
+
+def to_prometheus(stats=None):
+    stats = totals() if stats is None else stats
+    metrics = [
+        ("date_logger_calls_total", "counter", "Instrumented calls", 'calls', 1),
+        ("date_logger_duration_seconds_total", "counter", "Inclusive wall time", 'total_ms', 0.001),
+        ("date_logger_duration_seconds_max", "gauge", "Slowest single call", 'max_ms', 0.001),
+        ("date_logger_sql_statements_total", "counter", "SQL statements executed", 'queries', 1),
+    ]
+    lines = []
+    for metric, kind, help_text, key, scale in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name in sorted(stats):
+            lines.append(f'{metric}{{function="{name}"}} {stats[name][key] * scale:g}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import db
+
+# Lives next to the date log DB, in its own file so cache churn never contends with entry writes
+CACHE_FILENAME = "response_cache.db"
+TTL_SECONDS = 24 * 60 * 60
+MAX_ENTRIES = 1000
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+def cache_file():
+    return os.path.join(os.path.dirname(db.resolve()), CACHE_FILENAME)
+
+def _ensure_schema(path):
+    if path in _initialized:
+        return
+    with _init_lock:
+        if path in _initialized:
+            return
+        with db.transaction(path) as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS response_cache (
+                                key TEXT PRIMARY KEY,
+                                response TEXT NOT NULL,
+                                created_at REAL NOT NULL,
+                                last_used REAL NOT NULL
+                            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used)")
+        _initialized.add(path)
+
+def make_key(model_name, user_profile, context_version, user_query, *extra):
+    payload = json.dumps([model_name, user_profile or {}, context_version, user_query, *extra],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get(key):
+    path = cache_file()
+    _ensure_schema(path)
+    now = time.time()
+    with db.connection(path) as conn:
+        row = conn.execute("SELECT response FROM response_cache WHERE key = ? AND created_at > ?",
+                           (key, now - TTL_SECONDS)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+    return row[0]
+
+def put(key, response):
+    path = cache_file()
+    _ensure_schema(path)
+    now = time.time()
+    with db.transaction(path) as conn:
+        conn.execute('''INSERT INTO response_cache (key, response, created_at, last_used)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                        response=excluded.response,
+                        created_at=excluded.created_at,
+                        last_used=excluded.last_used''', (key, response, now, now))
+        # Expire by TTL, then trim least recently used rows beyond MAX_ENTRIES
+        conn.execute("DELETE FROM response_cache WHERE created_at <= ?", (now - TTL_SECONDS,))
+        conn.execute('''DELETE FROM response_cache WHERE key IN (
+                            SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                        )''', (MAX_ENTRIES,))
+
+def clear():
+    path = cache_file()
+    _ensure_schema(path)
+    with db.transaction(path) as conn:
+        conn.execute("DELETE FROM response_cache")
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_utils
+import data_manager as dm
+import db
+import llm_backends
+
+# Model calls in flight at once during a batch run
+CONCURRENCY = 4
+# (calls per second, burst); keep under the provider's quota for the key
+RATE_LIMIT = (2.0, 4)
+# Entries per write transaction; also the unit progress is reported in
+BATCH_SIZE = 50
+SUMMARY_MAX_WORDS = 40
+
+def summary_prompt(date, partner_name, notes, tags):
+    return (
+        "Summarize this dating-log entry for a dating coach in one or two sentences. Keep names, places, "
+        f"how it went and anything to follow up on. Stay under {SUMMARY_MAX_WORDS} words.\n\n"
+        f"Date: {date}\nPartner: {partner_name}\nTags: {tags or '(none)'}\nNotes: {notes or '(none)'}\n\n"
+        "USER QUESTION: Write the summary."
+    )
+
+def summary_status():
+    """(entries with a stored summary, total entries); stored summaries may be stale."""
+    with db.connection() as conn:
+        summarized = conn.execute("SELECT count(*) FROM entry_summaries").fetchone()[0]
+        total = conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+    return summarized, total
+
+def pending_entries(force=False):
+    """Entries whose stored summary is missing or was written from different content."""
+    with db.connection() as conn:
+        rows = conn.execute(f'''SELECT e.id, e.date, e.partner_name, e.notes, e.tags, s.content_hash
+                                FROM (SELECT {dm.ENTRY_COLUMNS} FROM entries e) e
+                                LEFT JOIN entry_summaries s ON s.entry_id = e.id
+                                ORDER BY e.id''').fetchall()
+    pending = []
+    for entry_id, date, partner_name, notes, tags, stored_hash in rows:
+        content_hash = dm.entry_content_hash(date, partner_name, notes, tags)
+        if force or content_hash != stored_hash:
+            pending.append((entry_id, date, partner_name, notes, tags, content_hash))
+    return pending
+
+def _save_summaries(results, model_name):
+    with db.transaction() as conn:
+        # Entries deleted while their summary was being written are skipped
+        conn.executemany('''INSERT INTO entry_summaries (entry_id, content_hash, summary, model_name, updated_at)
+                            SELECT ?, ?, ?, ?, CURRENT_TIMESTAMP WHERE EXISTS (SELECT 1 FROM entries WHERE id = ?)
+                            ON CONFLICT(entry_id) DO UPDATE SET
+                            content_hash=excluded.content_hash,
+                            summary=excluded.summary,
+                            model_name=excluded.model_name,
+                            updated_at=excluded.updated_at''',
+                         [(entry_id, content_hash, summary, model_name, entry_id)
+                          for entry_id, content_hash, summary in results])
+        # Summaries change the context AI answers are built from, so cached answers must not be reused
+        dm.bump_data_version(conn)
+
+def summarize_all(api_key="", backend=None, force=False, concurrency=CONCURRENCY, rate_limit=RATE_LIMIT,
+                  progress=None):
+    """Summarize every entry whose content changed since its last summary.
+
+    Model calls run concurrently (at most concurrency at once, started no
+    faster than rate_limit allows); results are written BATCH_SIZE at a time,
+    so an interrupted run keeps what it finished and the next run resumes
+    from there. progress(done, total) is called after each batch. Pass a
+    llm_backends.LocalBackend as backend to run offline.
+
+    Returns {'total', 'summarized', 'unchanged', 'failed', 'errors'}.
+    """
+    if backend is None:
+        backend = ai_utils.get_model(api_key) if ai_utils.ai_available(api_key) else None
+    if backend is None:
+        raise ValueError("An AI backend is required to summarize entries.")
+
+    with db.connection() as conn:
+        total = conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+    pending = pending_entries(force)
+    summary = {'total': total, 'summarized': 0, 'unchanged': total - len(pending), 'failed': 0, 'errors': []}
+    limiter = llm_backends.RateLimiter(*rate_limit) if rate_limit else None
+
+    def summarize(entry):
+        entry_id, date, partner_name, notes, tags, content_hash = entry
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            text = " ".join(backend.generate(summary_prompt(date, partner_name, notes, tags)).split())
+        except Exception as e:
+            return entry_id, content_hash, None, str(e)
+        return entry_id, content_hash, text, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for start in range(0, len(pending), BATCH_SIZE):
+            results = []
+            for entry_id, content_hash, text, error in pool.map(summarize, pending[start:start + BATCH_SIZE]):
+                if error or not text:
+                    summary['failed'] += 1
+                    summary['errors'].append((entry_id, error or "empty response"))
+                else:
+                    results.append((entry_id, content_hash, text))
+            if results:
+                _save_summaries(results, backend.model_name)
+            summary['summarized'] += len(results)
+            if progress:
+                progress(summary['unchanged'] + min(start + BATCH_SIZE, len(pending)), total)
+    return summary
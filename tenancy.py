@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Each tenant gets data/<tenant>/ holding its own database, response cache and media
+TENANTS_DIR = "data"
+DB_FILENAME = "date_log.db"
+# Header holding the signed-in user when the app runs behind an authenticating reverse
+# proxy. Only set it if the proxy overwrites the header on every request it forwards.
+TRUSTED_USER_HEADER = os.environ.get("DATE_LOGGER_TRUSTED_USER_HEADER", "")
+
+_TENANT_ID = re.compile(r"[a-z0-9][a-z0-9_.-]{0,63}")
+
+# None means the legacy single-user layout (db.DB_FILE, media_store.MEDIA_DIR).
+# A ContextVar rather than a thread-local so the tenant follows the caller into
+# contextvars.copy_context().run(...) and asyncio tasks.
+_current = ContextVar("date_logger_tenant", default=None)
+_created = set()
+
+def normalize(tenant_id):
+    """Map a user name to a safe directory name; raises ValueError if nothing usable is left."""
+    slug = re.sub(r"[^a-z0-9_.-]+", "-", (tenant_id or "").strip().lower()).strip("-.")
+    if not _TENANT_ID.fullmatch(slug):
+        raise ValueError(f"Invalid user name: {tenant_id!r}")
+    return slug
+
+def tenant_for_identity(identity):
+    """Tenant id for an authenticated identity (e-mail, OIDC subject, proxy user name).
+
+    The hash suffix keeps identities whose slugs collide ("a@b.com", "a-b.com") apart.
+    """
+    digest = hashlib.sha256(identity.encode()).hexdigest()[:12]
+    try:
+        slug = normalize(identity)[:40].rstrip("-.") or "user"
+    except ValueError:
+        slug = "user"
+    return f"{slug}-{digest}"
+
+def current():
+    return _current.get()
+
+def activate(tenant_id):
+    """Route this context to tenant_id (None/"" for the shared single-user data); returns a reset token."""
+    return _current.set(normalize(tenant_id) if tenant_id else None)
+
+def deactivate(token):
+    _current.reset(token)
+
+@contextmanager
+def use_tenant(tenant_id, migrate=True):
+    """Run the block against tenant_id's database and media directory.
+
+        with tenancy.use_tenant("alex"):
+            dm.add_entry(...)
+    """
+    token = activate(tenant_id)
+    try:
+        if migrate:
+            # Memoized per database file, so only the first use of a tenant pays for it
+            import migrations
+            migrations.migrate()
+        yield current()
+    finally:
+        deactivate(token)
+
+def tenant_dir(tenant_id=None):
+    tenant_id = tenant_id or current()
+    path = os.path.join(TENANTS_DIR, tenant_id)
+    if path not in _created:
+        os.makedirs(path, exist_ok=True)
+        _created.add(path)
+    return path
+
+def db_path(tenant_id=None):
+    return os.path.join(tenant_dir(tenant_id), DB_FILENAME)
+
+def list_tenants():
+    if not os.path.isdir(TENANTS_DIR):
+        return []
+    return sorted(name for name in os.listdir(TENANTS_DIR)
+                  if os.path.exists(os.path.join(TENANTS_DIR, name, DB_FILENAME)))